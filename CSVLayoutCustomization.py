@@ -4,15 +4,22 @@ import pandas as pd
 import os
 import json
 import re
+import multiprocessing
+from datetime import datetime
+import queue
+import threading
 from tkinter.scrolledtext import ScrolledText
 from tkinterdnd2 import DND_FILES, TkinterDnD
-import csv # csvモジュールをインポート
+import csv_layout_core as core
 
 class CSVLayoutTool(TkinterDnD.Tk):
     # --- 定数定義 ---
-    PROFILE_FILENAME = "csv_profiles.json"
-    DEFAULT_PREF_CODE_COLUMN = "都道府県コード"
-    EMPTY_COLUMN_PLACEHOLDER_PREFIX = "__EMPTY_COLUMN_"
+    PROFILE_FILENAME = core.PROFILE_FILENAME
+    DEFAULT_PREF_CODE_COLUMN = core.DEFAULT_PREF_CODE_COLUMN
+    EMPTY_COLUMN_PLACEHOLDER_PREFIX = core.EMPTY_COLUMN_PLACEHOLDER_PREFIX
+    DEFAULT_PREVIEW_ROWS = 10
+    TASK_POLL_INTERVAL_MS = 100 # ワーカースレッドからの通知を確認する間隔
+    INPUT_CACHE_MAX_BYTES = core.INPUT_CACHE_MAX_BYTES
 
     def __init__(self):
         super().__init__()
@@ -30,6 +37,33 @@ class CSVLayoutTool(TkinterDnD.Tk):
         # --- ヘッダー除去関連 ---
         self.remove_header_var = tk.BooleanVar(value=False)
 
+        # --- プレビュー関連 (先頭の指定行数のみ読み込む) ---
+        self.preview_rows_var = tk.IntVar(value=self.DEFAULT_PREVIEW_ROWS)
+        # 読み込み済みの入力を保持し、プロファイルの切り替え時は変換のみやり直す
+        self._input_cache = core.ParsedInputCache(self.INPUT_CACHE_MAX_BYTES)
+        # 変換の各段階の出力を保持し、設定を変更した段階以降のみやり直す
+        self._stage_checkpoints = core.StageCheckpoints()
+        # 変換結果全体のページ表示 (表示中の範囲の行のみ読み込み・変換する)
+        self._paged_result = None
+        self._row_index = None # 直近のファイルの行の位置の索引 (同じファイルでは再利用する)
+        self._preview_start = 0 # 表示中の先頭の行番号 (0始まり)
+        # 読み込んでいないページはワーカースレッドで読み込む (読み込み中に要求された範囲は最後のもののみ読み込む)
+        self._page_request = None
+        self._page_loading = False
+        self._page_lock = threading.Lock()
+        self.goto_row_var = tk.StringVar()
+        self.preview_position_var = tk.StringVar(value="")
+
+        # --- 分割保存 (大容量ファイル用) ---
+        self.stream_save_var = tk.BooleanVar(value=False)
+
+        # --- PyArrow による読み込み・保存 (導入済みの場合のみ選択可) ---
+        self.arrow_engine_var = tk.BooleanVar(value=False)
+        # --- メモリマップによる読み込み (大容量ファイル用。PyArrow が導入済みの場合のみ選択可) ---
+        self.memory_map_var = tk.BooleanVar(value=False)
+        # --- 複数プロセスによる並列変換 (大容量ファイル用) ---
+        self.parallel_var = tk.BooleanVar(value=False)
+
         # --- 都道府県削除関連 ---
         self.remove_prefecture_var = tk.BooleanVar(value=False)
         self.remove_prefecture_column_var = tk.StringVar()
@@ -39,26 +73,33 @@ class CSVLayoutTool(TkinterDnD.Tk):
         self.get_pref_code_source_column_var = tk.StringVar()
         self.get_pref_code_new_column_var = tk.StringVar(value=self.DEFAULT_PREF_CODE_COLUMN)
 
-        # --- 都道府県名とコードのマッピング ---
-        self.PREFECTURE_CODES = {
-            "北海道": "01", "青森県": "02", "岩手県": "03", "宮城県": "04", "秋田県": "05",
-            "山形県": "06", "福島県": "07", "茨城県": "08", "栃木県": "09", "群馬県": "10",
-            "埼玉県": "11", "千葉県": "12", "東京都": "13", "神奈川県": "14", "新潟県": "15",
-            "富山県": "16", "石川県": "17", "福井県": "18", "山梨県": "19", "長野県": "20",
-            "岐阜県": "21", "静岡県": "22", "愛知県": "23", "三重県": "24", "滋賀県": "25",
-            "京都府": "26", "大阪府": "27", "兵庫県": "28", "奈良県": "29", "和歌山県": "30",
-            "鳥取県": "31", "島根県": "32", "岡山県": "33", "広島県": "34", "山口県": "35",
-            "徳島県": "36", "香川県": "37", "愛媛県": "38", "高知県": "39", "福岡県": "40",
-            "佐賀県": "41", "長崎県": "42", "熊本県": "43", "大分県": "44", "宮崎県": "45",
-            "鹿児島県": "46", "沖縄県": "47"
-        }
-        self.PREFECTURES = list(self.PREFECTURE_CODES.keys())
-
         # --- 空列マッピング用の一時変数 ---
         self._empty_col_mapping = {}
 
+        # --- バックグラウンド処理関連 ---
+        # 読み込み・変換・保存はワーカースレッドで実行し、進捗や結果はキュー経由で受け取る
+        self._task_queue = queue.Queue()
+        self._task_id = 0
+        self._task_kind = None # 実行中の処理 ("preview" / "paging" / "save" / "batch" / None)
+        self._task_callbacks = None
+        self._cancel_event = None
+        self._close_requested = False
+        self.status_var = tk.StringVar(value="")
+
+        # --- 一括変換 (複数ファイル・フォルダのドロップ) ---
+        self._batch_window = None
+        self._batch_tree = None
+        self._batch_detail_text = None
+        self._batch_summary_var = tk.StringVar(value="")
+
+        # --- 処理時間・メモリの計測結果 (直近のプレビュー・保存) ---
+        self._last_metrics = None
+        self.metrics_summary_var = tk.StringVar(value="プレビューまたは保存を実行すると表示されます")
+
         # ウィジェット作成メソッドを呼び出す前にプレビュー関連の変数を初期化
         self.preview_frame = None
+        self.metrics_tree = None
+        self.metrics_warnings_text = None
         self.tree = None
         self.vsb = None
         self.hsb = None
@@ -66,6 +107,9 @@ class CSVLayoutTool(TkinterDnD.Tk):
         self.create_widgets()
         self.load_profiles()
 
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.after(self.TASK_POLL_INTERVAL_MS, self._poll_task_queue)
+
     def create_widgets(self):
         # メインフレーム
         main_frame = ttk.Frame(self)
@@ -230,13 +274,19 @@ class CSVLayoutTool(TkinterDnD.Tk):
         # 出力文字コード選択
         ttk.Label(encoding_frame, text="出力文字コード:").pack(side=tk.LEFT, padx=(0, 5))
         output_encoding_combo = ttk.Combobox(encoding_frame, textvariable=self.output_encoding, values=["utf-8", "shift_jis"], width=10, state="readonly")
-        output_encoding_combo.pack(side=tk.LEFT)
+        output_encoding_combo.pack(side=tk.LEFT, padx=(0, 15))
+
+        # プレビュー行数
+        ttk.Label(encoding_frame, text="プレビュー行数:").pack(side=tk.LEFT, padx=(0, 5))
+        preview_rows_spinbox = ttk.Spinbox(encoding_frame, textvariable=self.preview_rows_var, from_=1, to=1000, width=6)
+        preview_rows_spinbox.pack(side=tk.LEFT)
 
         # ドラッグ&ドロップエリア
         self.drop_area = ttk.LabelFrame(right_frame, text="CSVファイルをドロップ")
         self.drop_area.pack(fill=tk.X, padx=5, pady=5)
 
-        self.drop_label = ttk.Label(self.drop_area, text="ここにCSVファイルをドラッグ＆ドロップ", anchor=tk.CENTER)
+        self.drop_label = ttk.Label(self.drop_area, text="ここにCSVファイルをドラッグ＆ドロップ\n（複数ファイル・フォルダは一括変換）",
+                                    anchor=tk.CENTER, justify=tk.CENTER)
         self.drop_label.pack(fill=tk.X, padx=20, pady=20)
 
         # ドロップ領域の設定
@@ -246,6 +296,9 @@ class CSVLayoutTool(TkinterDnD.Tk):
         # ファイル選択ボタン
         ttk.Button(right_frame, text="ファイルを選択", command=self.select_file).pack(fill=tk.X, padx=5, pady=5)
 
+        # プレビュー更新ボタン (編集中の設定で再プレビュー)
+        ttk.Button(right_frame, text="プレビュー更新", command=self.refresh_preview).pack(fill=tk.X, padx=5, pady=(0, 5))
+
         # プレビュー領域のウィジェット
         self._create_preview_widgets(right_frame)
 
@@ -261,13 +314,83 @@ class CSVLayoutTool(TkinterDnD.Tk):
         )
         self.remove_header_check.pack(side=tk.LEFT, anchor=tk.W)
 
+        # 分割保存チェックボックス
+        stream_frame = ttk.Frame(right_frame)
+        stream_frame.pack(fill=tk.X, padx=5, pady=(2, 0))
+        self.stream_save_check = ttk.Checkbutton(
+            stream_frame,
+            text="大容量ファイルを分割して読み込み・保存する（メモリ節約）",
+            variable=self.stream_save_var,
+            onvalue=True,
+            offvalue=False
+        )
+        self.stream_save_check.pack(side=tk.LEFT, anchor=tk.W)
+
+        # PyArrow エンジンチェックボックス
+        arrow_frame = ttk.Frame(right_frame)
+        arrow_frame.pack(fill=tk.X, padx=5, pady=(2, 0))
+        self.arrow_engine_check = ttk.Checkbutton(
+            arrow_frame,
+            text="PyArrowで高速に読み込み・保存する（UTF-8のみ）",
+            variable=self.arrow_engine_var,
+            onvalue=True,
+            offvalue=False,
+            state=tk.NORMAL if core.pyarrow_available() else tk.DISABLED
+        )
+        self.arrow_engine_check.pack(side=tk.LEFT, anchor=tk.W)
+
+        # メモリマップ読み込みチェックボックス
+        memory_map_frame = ttk.Frame(right_frame)
+        memory_map_frame.pack(fill=tk.X, padx=5, pady=(2, 0))
+        self.memory_map_check = ttk.Checkbutton(
+            memory_map_frame,
+            text="大容量ファイルをメモリマップで読み込む（PyArrow）",
+            variable=self.memory_map_var,
+            onvalue=True,
+            offvalue=False,
+            state=tk.NORMAL if core.pyarrow_available() else tk.DISABLED
+        )
+        self.memory_map_check.pack(side=tk.LEFT, anchor=tk.W)
+
+        # 並列変換チェックボックス
+        parallel_frame = ttk.Frame(right_frame)
+        parallel_frame.pack(fill=tk.X, padx=5, pady=(2, 0))
+        self.parallel_check = ttk.Checkbutton(
+            parallel_frame,
+            text=f"大容量ファイルを複数のCPUで並列に変換する（{os.cpu_count() or 1}プロセス）",
+            variable=self.parallel_var,
+            onvalue=True,
+            offvalue=False,
+            state=tk.NORMAL if (os.cpu_count() or 1) > 1 else tk.DISABLED
+        )
+        self.parallel_check.pack(side=tk.LEFT, anchor=tk.W)
+
         # 実行ボタン
-        ttk.Button(right_frame, text="変換して保存", command=self.process_and_save).pack(fill=tk.X, padx=5, pady=5)
+        self.save_button = ttk.Button(right_frame, text="変換して保存", command=self.process_and_save)
+        self.save_button.pack(fill=tk.X, padx=5, pady=5)
+
+        # 進捗表示とキャンセルボタン
+        progress_frame = ttk.Frame(right_frame)
+        progress_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
+        self.progress_bar = ttk.Progressbar(progress_frame, mode="indeterminate", length=120)
+        self.progress_bar.pack(side=tk.LEFT, padx=(0, 5))
+        self.cancel_button = ttk.Button(progress_frame, text="キャンセル", command=self.cancel_task, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.RIGHT)
+        ttk.Label(progress_frame, textvariable=self.status_var, anchor=tk.W).pack(side=tk.LEFT, fill=tk.X, expand=True)
 
     def _create_preview_widgets(self, parent_frame):
+        # プレビューと処理時間・メモリの表示をタブで切り替える
+        preview_notebook = ttk.Notebook(parent_frame)
+        preview_notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        preview_tab = ttk.Frame(preview_notebook)
+        preview_notebook.add(preview_tab, text="プレビュー")
+        metrics_tab = ttk.Frame(preview_notebook)
+        preview_notebook.add(metrics_tab, text="処理時間・メモリ")
+        self._create_metrics_widgets(metrics_tab)
+
         # プレビュー領域フレーム
-        self.preview_frame = ttk.LabelFrame(parent_frame, text="プレビュー")
-        self.preview_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.preview_frame = ttk.Frame(preview_tab)
+        self.preview_frame.pack(fill=tk.BOTH, expand=True)
 
         # スクロールバー
         self.vsb = ttk.Scrollbar(self.preview_frame, orient="vertical")
@@ -276,13 +399,48 @@ class CSVLayoutTool(TkinterDnD.Tk):
         self.hsb.pack(side=tk.BOTTOM, fill=tk.X)
 
         # Treeview
-        self.tree = ttk.Treeview(self.preview_frame, yscrollcommand=self.vsb.set, xscrollcommand=self.hsb.set)
+        self.tree = ttk.Treeview(self.preview_frame, yscrollcommand=self._on_tree_yscroll, xscrollcommand=self.hsb.set)
         self.tree.pack(fill=tk.BOTH, expand=True)
+        self._bind_preview_scroll()
 
         # スクロールバーのcommand設定
-        self.vsb.config(command=self.tree.yview)
+        # 縦スクロールは変換結果全体の中での表示範囲の移動として扱う
+        self.vsb.config(command=self._on_preview_scroll)
         self.hsb.config(command=self.tree.xview)
 
+        # 行番号を指定して移動
+        navigation_frame = ttk.Frame(preview_tab)
+        navigation_frame.pack(fill=tk.X, pady=(5, 0))
+        ttk.Label(navigation_frame, text="行へ移動:").pack(side=tk.LEFT, padx=(0, 5))
+        goto_entry = ttk.Entry(navigation_frame, textvariable=self.goto_row_var, width=10)
+        goto_entry.pack(side=tk.LEFT)
+        goto_entry.bind("<Return>", lambda event: self._goto_preview_row())
+        ttk.Button(navigation_frame, text="移動", command=self._goto_preview_row, width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Label(navigation_frame, textvariable=self.preview_position_var, anchor=tk.E).pack(side=tk.RIGHT)
+
+    def _create_metrics_widgets(self, parent_frame):
+        # 対象のファイル・合計時間と JSON 保存ボタン
+        summary_frame = ttk.Frame(parent_frame)
+        summary_frame.pack(fill=tk.X, pady=(5, 0))
+        ttk.Button(summary_frame, text="JSONで保存", command=self.export_metrics).pack(side=tk.RIGHT)
+        ttk.Label(summary_frame, textvariable=self.metrics_summary_var, anchor=tk.W).pack(
+            side=tk.LEFT, fill=tk.X, expand=True)
+
+        # 段階ごとの処理時間・行数・列数・メモリ使用量の増減
+        columns = ("seconds", "rows_in", "rows_out", "columns", "memory")
+        self.metrics_tree = ttk.Treeview(parent_frame, columns=columns, height=8)
+        self.metrics_tree.heading("#0", text="段階")
+        self.metrics_tree.column("#0", width=150, stretch=False)
+        for column, text in zip(columns, ("処理時間(秒)", "入力行数", "出力行数", "列数", "メモリ増減(MB)")):
+            self.metrics_tree.heading(column, text=text)
+            self.metrics_tree.column(column, width=90, anchor=tk.E)
+        self.metrics_tree.pack(fill=tk.BOTH, expand=True, pady=5)
+
+        # 処理中の警告 (パッケージ化した exe ではコンソール出力が見えないため、コンソールには出力せず画面に表示する)
+        ttk.Label(parent_frame, text="処理中の警告:").pack(anchor=tk.W)
+        self.metrics_warnings_text = ScrolledText(parent_frame, height=4, wrap=tk.WORD, state=tk.DISABLED)
+        self.metrics_warnings_text.pack(fill=tk.X)
+
     def _recreate_treeview(self):
         if self.tree:
             try:
@@ -291,11 +449,12 @@ class CSVLayoutTool(TkinterDnD.Tk):
                 pass # 既に破棄されている場合など
 
         # 新しいTreeviewを作成
-        self.tree = ttk.Treeview(self.preview_frame, yscrollcommand=self.vsb.set, xscrollcommand=self.hsb.set)
+        self.tree = ttk.Treeview(self.preview_frame, yscrollcommand=self._on_tree_yscroll, xscrollcommand=self.hsb.set)
         self.tree.pack(fill=tk.BOTH, expand=True) # 再度packする
+        self._bind_preview_scroll()
 
         # スクロールバーのcommandを新しいTreeviewに再設定
-        self.vsb.config(command=self.tree.yview)
+        self.vsb.config(command=self._on_preview_scroll)
         self.hsb.config(command=self.tree.xview)
 
         # 新しいTreeviewをスクロールバーの前に表示させる
@@ -305,8 +464,7 @@ class CSVLayoutTool(TkinterDnD.Tk):
     def load_profiles(self):
         try:
             if os.path.exists(self.PROFILE_FILENAME):
-                with open(self.PROFILE_FILENAME, "r", encoding="utf-8") as f:
-                    self.profiles = json.load(f)
+                self.profiles = core.load_profiles(self.PROFILE_FILENAME)
 
                 self.profile_combobox["values"] = list(self.profiles.keys())
                 if self.profiles:
@@ -330,17 +488,7 @@ class CSVLayoutTool(TkinterDnD.Tk):
                 messagebox.showerror("エラー", "同名のプロファイルが既に存在します")
                 return
 
-            self.profiles[profile_name] = {
-                "reorder": "",
-                "merge": "",
-                "extract": "",
-                "remove": "",
-                "add": "",
-                "replace": "",
-                "remove_prefecture": {"enabled": False, "column": ""},
-                "get_pref_code": {"enabled": False, "source_column": "", "new_column": self.DEFAULT_PREF_CODE_COLUMN},
-                "remove_header": False
-            }
+            self.profiles[profile_name] = core.default_profile()
 
             self.profile_combobox["values"] = list(self.profiles.keys())
             self.current_profile_name.set(profile_name)
@@ -353,6 +501,20 @@ class CSVLayoutTool(TkinterDnD.Tk):
             messagebox.showerror("エラー", "プロファイルが選択されていません")
             return
 
+        self.profiles[profile_name] = self._collect_profile_settings()
+
+        self.save_profiles()
+        # 設定内容を検証し、形式の誤りがあれば保存後に知らせる (該当行は変換時にスキップされる)
+        errors = core.compile_profile(self.profiles[profile_name]).errors
+        if errors:
+            messagebox.showwarning("設定の確認",
+                                   f"プロファイル「{profile_name}」を保存しましたが、次の設定は変換時にスキップされます:\n\n"
+                                   + "\n".join(errors))
+        else:
+            messagebox.showinfo("保存完了", f"プロファイル「{profile_name}」を保存しました")
+
+    def _collect_profile_settings(self) -> dict:
+        """現在の画面の設定内容をプロファイル形式の辞書として返す"""
         merge_lines = self.merge_text.get("1.0", tk.END).splitlines()
         while merge_lines and not merge_lines[-1].strip():
             merge_lines.pop()
@@ -377,7 +539,7 @@ class CSVLayoutTool(TkinterDnD.Tk):
         while replace_lines and not replace_lines[-1].strip(): replace_lines.pop()
         replace_setting_cleaned = "\n".join(replace_lines)
 
-        self.profiles[profile_name] = {
+        return {
             "reorder": reorder_setting_cleaned,
             "merge": merge_setting_cleaned,
             "extract": extract_setting_cleaned,
@@ -396,9 +558,6 @@ class CSVLayoutTool(TkinterDnD.Tk):
             "remove_header": self.remove_header_var.get()
         }
 
-        self.save_profiles()
-        messagebox.showinfo("保存完了", f"プロファイル「{profile_name}」を保存しました")
-
     def delete_profile(self):
         profile_name = self.current_profile_name.get()
         if not profile_name:
@@ -484,34 +643,41 @@ class CSVLayoutTool(TkinterDnD.Tk):
             # プロファイル変更時もTreeview再生成とプレビューを行う
             self.after_idle(lambda: self._clear_and_preview_logic(self.current_file))
 
+    def refresh_preview(self):
+        """編集中の設定で現在のファイルを再プレビューする (設定を変更した段階以降のみ変換し直す)"""
+        if not self.current_file:
+            messagebox.showinfo("情報", "プレビューするCSVファイルが選択されていません")
+            return
+        self._clear_and_preview_logic(self.current_file)
+
     def select_file(self):
         file_path = filedialog.askopenfilename(
             title="CSVファイルを選択",
-            filetypes=[("CSVファイル", "*.csv"), ("すべてのファイル", "*.*")]
+            filetypes=[("CSVファイル", "*.csv"), ("圧縮CSVファイル", "*.csv.gz *.csv.bz2 *.csv.xz *.zip"),
+                       ("すべてのファイル", "*.*")]
         )
         if file_path:
             self.after_idle(lambda: self._clear_and_preview_logic(file_path))
 
     def drop(self, event):
         try:
-            # ドラッグされたデータの解析 (より堅牢に)
-            raw_path = event.data.strip()
-            if raw_path.startswith('{') and raw_path.endswith('}'):
-                raw_path = raw_path[1:-1]
-            if raw_path.startswith('"') and raw_path.endswith('"'):
-                raw_path = raw_path[1:-1]
-            # 複数のファイルがドロップされた場合も考慮 (最初のファイルのみ処理)
-            file_paths = raw_path.split() # スペース区切りを仮定
-            if not file_paths:
+            # ドロップされたパスの一覧を解析する (空白を含むパスは {} で囲まれている)
+            dropped_paths = [path for path in self.tk.splitlist(event.data) if path]
+            if not dropped_paths:
                 messagebox.showerror("エラー", "有効なファイルパスを取得できませんでした。")
                 return
-            file_path = file_paths[0] # 最初のファイルパスを使用
 
+            if len(dropped_paths) > 1 or os.path.isdir(dropped_paths[0]):
+                # 複数ファイル・フォルダは現在のプロファイルで一括変換する
+                self._confirm_batch(dropped_paths)
+                return
+
+            file_path = dropped_paths[0]
             if not os.path.isfile(file_path):
                 messagebox.showerror("エラー", f"有効なファイルではありません:\n{file_path}")
                 return
-            if not file_path.lower().endswith('.csv'):
-                messagebox.showerror("エラー", "CSVファイルのみ対応しています")
+            if not core.is_csv_input(file_path):
+                messagebox.showerror("エラー", "CSVファイル（.csv、圧縮ファイル .csv.gz / .csv.bz2 / .csv.xz、.zip）のみ対応しています")
                 return
 
             self.after_idle(lambda: self._clear_and_preview_logic(file_path))
@@ -522,6 +688,9 @@ class CSVLayoutTool(TkinterDnD.Tk):
 
     def _clear_and_preview_logic(self, file_path):
         """Treeviewを再生成し、新しいファイルをプレビューする"""
+        if self._is_saving():
+            messagebox.showwarning("処理中", "保存処理の実行中です。完了またはキャンセルしてから操作してください。")
+            return
         try:
             # Treeviewを再生成
             self._recreate_treeview()
@@ -529,6 +698,10 @@ class CSVLayoutTool(TkinterDnD.Tk):
             # 現在のファイルとプレビューデータをクリア
             self.current_file = None
             self.preview_df = None
+            self._paged_result = None
+            self._preview_start = 0
+            # 前のファイルのメモリマップを解放する (Windows ではマップ中のファイルを上書きできないため)
+            core.release_mapped_inputs()
 
             # 新しいファイルをプレビュー
             self.preview_file(file_path)
@@ -541,6 +714,9 @@ class CSVLayoutTool(TkinterDnD.Tk):
         """エラー発生時に状態をクリアし、Treeviewも再生成する"""
         self.current_file = None
         self.preview_df = None
+        self._paged_result = None
+        self._preview_start = 0
+        self.preview_position_var.set("")
         try:
             # エラー時もTreeviewを再生成してクリーンな状態にする
             self._recreate_treeview()
@@ -549,423 +725,184 @@ class CSVLayoutTool(TkinterDnD.Tk):
              print(f"警告: エラー後のTreeview再生成中にエラー: {cleanup_error}")
 
     def preview_file(self, file_path):
+        """ファイルの先頭部分をワーカースレッドで読み込み・変換し、完了後にプレビューを表示する"""
+        selected_encoding = self.encoding.get()
+        # プレビューには先頭の数行のみ読み込む (全件の読み込みは保存時に行う)
+        # 表示行数より1行多く読み込み、続きがあるかどうかの判定に使う
+        sample_rows = self._preview_row_count() + 1
+        profile = self._collect_profile_settings()
+        memory_map = self.memory_map_var.get()
+
+        self._start_task(
+            "preview",
+            lambda progress, cancel_event: self._load_preview_sample(
+                self._input_cache, self._stage_checkpoints, file_path, selected_encoding, sample_rows, profile,
+                progress, cancel_event, memory_map),
+            on_done=lambda result: self._on_preview_loaded(file_path, selected_encoding, result),
+            on_error=lambda error: self._on_preview_failed(file_path, selected_encoding, error),
+            status_text="プレビューを読み込み中..."
+        )
+
+    @staticmethod
+    def _load_preview_sample(input_cache, checkpoints, file_path, encoding, sample_rows, profile,
+                             progress, cancel_event, memory_map=False) -> dict:
+        """(ワーカースレッドで実行) 先頭 sample_rows 行を読み込んで変換する。ウィジェットには触れない"""
+        tracker = core.ProgressTracker(progress, cancel_event)
+        tracker.update("読み込み")
+        metrics = core.StageMetrics()
+        started = metrics.start()
+        # ファイル先頭から判定した文字コードで読み込む (読めない場合のみ代替の文字コードを試す)
+        # 読み込み済みのファイルはキャッシュを使う。プロファイルによらず使えるよう、すべての項目を読み込む
+        # メモリマップで読み込む場合、同じマップを保存時の全件の読み込みでも使う
+        df, used_encoding = input_cache.read(file_path, encoding, nrows=sample_rows, memory_map=memory_map)
+        metrics.add("読み込み", started, rows_out=len(df), columns_out=len(df.columns))
+        tracker.update(rows_read=len(df))
+
+        processor = core.CSVLayoutProcessor(profile, on_stage=tracker.update, checkpoints=checkpoints, metrics=metrics)
         try:
-            selected_encoding = self.encoding.get()
-            df = None
-            try:
-                # keep_default_na=False で空文字列を NaN にしない
-                # dtype=str ですべての列を文字列として読み込む
-                df = pd.read_csv(file_path, encoding=selected_encoding, dtype=str, keep_default_na=False)
-            except UnicodeDecodeError:
-                alternative_encoding = "shift_jis" if selected_encoding == "utf-8" else "utf-8"
-                try:
-                    df = pd.read_csv(file_path, encoding=alternative_encoding, dtype=str, keep_default_na=False)
-                    self.encoding.set(alternative_encoding)
-                    messagebox.showinfo("エンコーディング変更",
-                                        f"選択されたエンコーディング({selected_encoding})では読み込めませんでした。\n"
-                                        f"代わりに{alternative_encoding}で読み込みました。")
-                except UnicodeDecodeError:
-                    messagebox.showerror("エラー", "UTF-8とShift-JISのどちらでもファイルを読み込めませんでした。\n"
-                                                "ファイルの文字コードを確認してください。")
-                    self._cleanup_on_error()
-                    return
-                except FileNotFoundError:
-                     messagebox.showerror("エラー", f"ファイルが見つかりません:\n{file_path}")
-                     self._cleanup_on_error()
-                     return
-                except pd.errors.EmptyDataError:
-                     messagebox.showerror("エラー", f"ファイルが空か、CSVデータが含まれていません:\n{file_path}")
-                     self._cleanup_on_error()
-                     return
-                except Exception as inner_e:
-                     messagebox.showerror("エラー", f"ファイルの読み込み中にエラーが発生しました ({alternative_encoding}):\n{str(inner_e)}")
-                     self._cleanup_on_error()
-                     return
-            except FileNotFoundError:
-                 messagebox.showerror("エラー", f"ファイルが見つかりません:\n{file_path}")
-                 self._cleanup_on_error()
-                 return
-            except pd.errors.EmptyDataError:
-                 messagebox.showerror("エラー", f"ファイルが空か、CSVデータが含まれていません:\n{file_path}")
-                 self._cleanup_on_error()
-                 return
-            except Exception as outer_e:
-                 messagebox.showerror("エラー", f"ファイルの読み込み中にエラーが発生しました ({selected_encoding}):\n{str(outer_e)}")
-                 self._cleanup_on_error()
-                 return
+            result_df = processor.process_dataframe(df)
+            process_error = None
+        except core.ConversionCancelled:
+            raise
+        except Exception as e:
+            # 変換に失敗した場合は元のデータをそのまま表示する (変換処理は元の DataFrame を変更しない)
+            result_df = df
+            processor.empty_col_mapping = {}
+            process_error = e
+
+        return {
+            "profile": profile,
+            "encoding": used_encoding,
+            "preview_df": result_df,
+            "empty_col_mapping": processor.empty_col_mapping,
+            "warnings": processor.warnings,
+            "metrics": metrics.to_list(),
+            "process_error": process_error,
+        }
 
-            # dfがNoneでないことを確認
-            if df is None:
-                messagebox.showerror("エラー", "データフレームの読み込みに失敗しました。")
-                self._cleanup_on_error()
-                return
+    def _on_preview_loaded(self, file_path, selected_encoding, result: dict):
+        try:
+            self._apply_detected_encoding(selected_encoding, result["encoding"])
 
             self.current_file = file_path
             self.title(f"CSVレイアウト変更ツール - {os.path.basename(file_path)}")
 
+            if result["process_error"] is not None:
+                messagebox.showerror("データ処理エラー", f"データ処理中に予期せぬエラーが発生しました:\n{str(result['process_error'])}")
+            self._show_metrics("プレビュー", file_path, None, result)
+
             # プレビューの作成
-            self.preview_df = self.process_dataframe(df)
+            self.preview_df = result["preview_df"]
+            self._empty_col_mapping = result["empty_col_mapping"]
+            self._paged_result = None
+            self._preview_start = 0
             self.update_preview()
 
+            # 続きの行がある場合は行の位置を調べ、変換結果全体をスクロール・行番号指定で表示できるようにする
+            if (result["process_error"] is None and not self.preview_df.empty
+                    and len(self.preview_df) > self._preview_row_count()):
+                self._start_paged_preview(file_path, result["encoding"], result["profile"])
+
         except Exception as e:
             messagebox.showerror("エラー", f"ファイルプレビュー処理中に予期せぬエラーが発生しました: {str(e)}")
             self._cleanup_on_error()
 
-    def process_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        DataFrameに対して定義された処理を実行する。
-        エラーが発生した場合は元のDataFrameのコピーを返す。
-        """
-        try:
-            result_df = df.copy()
-            warnings = [] # 処理中の警告を収集するリスト
-
-            result_df, warnings = self._process_get_pref_code(result_df, warnings)
-            result_df, warnings = self._process_remove_prefecture(result_df, warnings)
-            result_df, warnings = self._process_extract(result_df, warnings)
-            result_df, warnings = self._process_remove(result_df, warnings)
-            result_df, warnings = self._process_add(result_df, warnings)
-            result_df, warnings = self._process_replace(result_df, warnings)
-            result_df, warnings = self._process_merge(result_df, warnings)
-            result_df, warnings = self._process_reorder(result_df, warnings)
-
-            # 警告があればコンソールに出力 (必要に応じてUI表示に変更)
-            if warnings:
-                print("-" * 20 + " 処理中の警告 " + "-" * 20)
-                for warn in warnings:
-                    print(warn)
-                print("-" * 55)
-
-            return result_df
-
-        except Exception as e:
-            messagebox.showerror("データ処理エラー", f"データ処理中に予期せぬエラーが発生しました:\n{str(e)}")
-            return df.copy() # エラー時は元のコピーを返す
-
-    def _process_get_pref_code(self, df: pd.DataFrame, warnings: list) -> (pd.DataFrame, list):
-        if self.get_pref_code_var.get():
-            source_col = self.get_pref_code_source_column_var.get().strip()
-            new_col = self.get_pref_code_new_column_var.get().strip() or self.DEFAULT_PREF_CODE_COLUMN
-
-            if not source_col:
-                warnings.append("都道府県コード取得: 都道府県名を含む項目名が指定されていません。")
-                return df, warnings
-            if not new_col:
-                warnings.append("都道府県コード取得: 新しい項目名が指定されていません。")
-                return df, warnings
-
-            if source_col not in df.columns:
-                warnings.append(f"都道府県コード取得: 対象項目 '{source_col}' が見つかりません。")
-                return df, warnings
-            if new_col in df.columns:
-                warnings.append(f"都道府県コード取得: 新しい項目名 '{new_col}' は既に存在します。処理をスキップします。")
-                return df, warnings
-
-            def get_code(address):
-                if isinstance(address, str):
-                    for pref, code in self.PREFECTURE_CODES.items():
-                        if address.startswith(pref):
-                            return code
-                return "" # 見つからない場合は空文字
-
-            try:
-                df[new_col] = df[source_col].apply(get_code)
-            except Exception as e:
-                 warnings.append(f"都道府県コード取得処理中にエラー: {e}")
-
-        return df, warnings
-
-    def _process_remove_prefecture(self, df: pd.DataFrame, warnings: list) -> (pd.DataFrame, list):
-        if self.remove_prefecture_var.get():
-            target_columns_str = self.remove_prefecture_column_var.get().strip()
-            if not target_columns_str:
-                warnings.append("都道府県名削除: 対象項目名が指定されていません。")
-                return df, warnings
-
-            target_columns = [col.strip() for col in target_columns_str.split(',') if col.strip()]
-            valid_target_columns = []
-            for target_column in target_columns:
-                if target_column in df.columns:
-                    valid_target_columns.append(target_column)
-                else:
-                    warnings.append(f"都道府県名削除: 対象項目 '{target_column}' が見つかりません。")
-
-            if not valid_target_columns:
-                return df, warnings # 有効な対象列がない
-
-            def remove_pref(address):
-                if isinstance(address, str):
-                    for pref in self.PREFECTURES:
-                        if address.startswith(pref):
-                            return address[len(pref):]
-                return address
-
-            try:
-                for target_column in valid_target_columns:
-                    df[target_column] = df[target_column].apply(remove_pref)
-            except Exception as e:
-                warnings.append(f"都道府県名削除処理中にエラー: {e}")
-
-        return df, warnings
-
-    def _process_merge(self, df: pd.DataFrame, warnings: list) -> (pd.DataFrame, list):
-        # merge_text から設定を取得し、末尾の不要な空行を除去
-        merge_lines = self.merge_text.get("1.0", tk.END).splitlines()
-        while merge_lines and not merge_lines[-1].strip():
-            merge_lines.pop()
-        merge_settings_content = "\n".join(merge_lines)
-
-        if merge_settings_content:
-            # 各行を処理 (enumerate は 1 始まり)
-            for line_num, line in enumerate(merge_settings_content.split('\n'), 1):
-                # 先に strip せずに、まず空行かどうかだけチェック
-                if not line.strip(): continue # 実質的に空の行はスキップ
-
-                try:
-                    # コロンでの分割は元の line に対して行う
-                    parts = line.split(':', 1)
-                    if len(parts) != 2:
-                        warnings.append(f"結合設定(行 {line_num}): 形式が不正です (':')。スキップします: {line.strip()}")
-                        continue
-
-                    # 新項目名部分のみ strip する
-                    new_column = parts[0].strip()
-                    # merge_info は strip せず、元の文字列（末尾スペースを含む可能性あり）を保持
-                    merge_info = parts[1]
-
-                    if not new_column:
-                        warnings.append(f"結合設定(行 {line_num}): 新項目名が空です。スキップします: {line.strip()}")
-                        continue
-
-                    # --- 区切り文字抽出 ---
-                    last_comma_index = merge_info.rfind(',')
-                    if last_comma_index == -1:
-                        # カンマがない場合: 結合元は1つ、区切り文字なしと解釈
-                        source_columns_str = merge_info.strip()
-                        separator = ''
-                        source_columns = [source_columns_str] if source_columns_str else []
-                        if not source_columns:
-                             warnings.append(f"結合設定(行 {line_num}): 結合元項目が指定されていません。スキップします: {line.strip()}")
-                             continue
-                    else:
-                        # 最後のカンマより前が結合元項目リスト、後ろが区切り文字
-                        source_columns_str = merge_info[:last_comma_index].strip()
-                        separator = merge_info[last_comma_index + 1:] # 末尾のスペース等も区切り文字の一部として保持
-                        source_columns = [col.strip() for col in source_columns_str.split(',') if col.strip()]
-                        if not source_columns:
-                            warnings.append(f"結合設定(行 {line_num}): 結合元項目が指定されていません。スキップします: {line.strip()}")
-                            continue
-
-                    # 結合元項目がDataFrameに存在するかチェック
-                    missing_cols = [col for col in source_columns if col not in df.columns]
-                    if missing_cols:
-                        warnings.append(f"結合設定(行 {line_num}): 結合元項目が見つかりません: {', '.join(missing_cols)}。スキップします: {line.strip()}")
-                        continue
-
-                    # 新しい項目名が既に存在する場合の警告
-                    if new_column in df.columns:
-                        warnings.append(f"結合設定(行 {line_num}): 結合先の項目名 '{new_column}' は既に存在します。上書きします。")
-
-                    # 結合実行 (NaNを空文字に変換)
-                    try:
-                        # apply内のlambda関数
-                        def join_items(row_items, sep):
-                            # 各要素を文字列に変換（NaNは空文字に）
-                            items = [str(item) if pd.notna(item) else '' for item in row_items]
-                            # 区切り文字で結合
-                            return sep.join(items)
-
-                        # DataFrameに関数を適用
-                        df[new_column] = df[source_columns].apply(lambda x: join_items(x, separator), axis=1)
-
-                    except Exception as apply_ex:
-                         warnings.append(f"結合設定(行 {line_num}): apply処理中にエラー: {apply_ex}。スキップ: {line.strip()}")
-                         continue # この行の処理をスキップ
-
-                except Exception as merge_ex:
-                    warnings.append(f"結合設定(行 {line_num}): 処理中にエラーが発生しました: {merge_ex}。スキップします: {line.strip()}")
-        return df, warnings
-
-    def _process_extract(self, df: pd.DataFrame, warnings: list) -> (pd.DataFrame, list):
-        extract_settings = self.extract_text.get("1.0", tk.END).strip()
-        if extract_settings:
-            for line_num, line in enumerate(extract_settings.split('\n'), 1):
-                line = line.strip()
-                if not line: continue
-                try:
-                    parts = line.split(':', 3)
-                    if len(parts) != 4:
-                        warnings.append(f"文字列抽出(行 {line_num}): 形式が不正 ('新:元:開始:文字数')。スキップします: {line}")
-                        continue
-
-                    new_col, source_col, start_pos_str, num_chars_str = [p.strip() for p in parts]
-
-                    if not new_col: warnings.append(f"文字列抽出(行 {line_num}): 新項目名が空。スキップ: {line}"); continue
-                    if not source_col: warnings.append(f"文字列抽出(行 {line_num}): 抽出元項目が空。スキップ: {line}"); continue
-                    if source_col not in df.columns: warnings.append(f"文字列抽出(行 {line_num}): 抽出元項目 '{source_col}' が見つかりません。スキップ。"); continue
-                    if new_col in df.columns: warnings.append(f"文字列抽出(行 {line_num}): 新項目名 '{new_col}' は既に存在。上書きします。")
-
-                    try:
-                        start_pos = int(start_pos_str)
-                        num_chars = int(num_chars_str)
-                        if start_pos < 1: warnings.append(f"文字列抽出(行 {line_num}): 開始位置は1以上。スキップ: {line}"); continue
-                        if num_chars < 0: warnings.append(f"文字列抽出(行 {line_num}): 文字数は0以上。スキップ: {line}"); continue
-                    except ValueError: warnings.append(f"文字列抽出(行 {line_num}): 開始位置/文字数が数値でない。スキップ: {line}"); continue
-
-                    start_index = start_pos - 1 # 0-based index
-                    end_index = start_index + num_chars
-
-                    def extract_substring(text):
-                        if pd.isna(text): return ""
-                        text_str = str(text)
-                        if start_index >= len(text_str): return "" # 開始位置が文字列長以上
-                        # 抽出範囲が文字列を超える場合、最後まで抽出
-                        actual_end_index = min(end_index, len(text_str))
-                        return text_str[start_index:actual_end_index]
-
-                    df[new_col] = df[source_col].apply(extract_substring)
-
-                except Exception as extract_ex:
-                    warnings.append(f"文字列抽出(行 {line_num}): 処理中にエラー: {extract_ex}。スキップ: {line}")
-        return df, warnings
-
-    def _process_remove(self, df: pd.DataFrame, warnings: list) -> (pd.DataFrame, list):
-        remove_settings = self.remove_text.get("1.0", tk.END).strip()
-        if remove_settings:
-            for line_num, line in enumerate(remove_settings.split('\n'), 1):
-                line = line.strip()
-                if not line: continue
-                try:
-                    parts = line.split(':', 1)
-                    if len(parts) != 2:
-                        warnings.append(f"文字除去(行 {line_num}): 形式が不正 (':')。スキップ: {line}"); continue
-
-                    column = parts[0].strip()
-                    chars_to_remove_str = parts[1].strip() # 除去する文字列表記 (カンマ区切り)
-
-                    if not column: warnings.append(f"文字除去(行 {line_num}): 項目名が空。スキップ: {line}"); continue
-                    if not chars_to_remove_str: warnings.append(f"文字除去(行 {line_num}): 除去文字が空。スキップ: {line}"); continue
-                    if column not in df.columns: warnings.append(f"文字除去(行 {line_num}): 項目 '{column}' が見つかりません。スキップ。"); continue
-
-                    # カンマ区切りで除去文字リストを作成
-                    chars_to_remove_list = [c.strip() for c in chars_to_remove_str.split(',') if c.strip()]
-                    if not chars_to_remove_list: warnings.append(f"文字除去(行 {line_num}): 有効な除去文字がありません。スキップ: {line}"); continue
-
-                    # 各除去文字に対してreplaceを実行
-                    temp_series = df[column].astype(str) # 文字列に変換
-                    for char in chars_to_remove_list:
-                        # regex=False でリテラル文字列として置換
-                        temp_series = temp_series.str.replace(char, '', regex=False)
-                    df[column] = temp_series
-
-                except Exception as remove_ex:
-                    warnings.append(f"文字除去(行 {line_num}): 処理中にエラー: {remove_ex}。スキップ: {line}")
-        return df, warnings
-
-    def _process_add(self, df: pd.DataFrame, warnings: list) -> (pd.DataFrame, list):
-        add_settings = self.add_text.get("1.0", tk.END).strip()
-        if add_settings:
-            for line_num, line in enumerate(add_settings.split('\n'), 1):
-                line = line.strip()
-                if not line: continue
-                try:
-                    parts = line.split(':', 2)
-                    if len(parts) != 3:
-                        warnings.append(f"文字追加(行 {line_num}): 形式が不正 ('項目:位置:追加文字')。スキップ: {line}"); continue
-
-                    column, position, chars_to_add = [p.strip() for p in parts]
-
-                    if not column: warnings.append(f"文字追加(行 {line_num}): 項目名が空。スキップ: {line}"); continue
-                    if position not in ["前", "後"]: warnings.append(f"文字追加(行 {line_num}): 位置は '前' または '後'。スキップ: {line}"); continue
-                    if column not in df.columns: warnings.append(f"文字追加(行 {line_num}): 項目 '{column}' が見つかりません。スキップ。"); continue
-
-                    # fillna('') を使って NaN を空文字列に変換してから追加
-                    col_series = df[column].fillna('').astype(str)
-                    if position == "前":
-                        df[column] = chars_to_add + col_series
-                    elif position == "後":
-                        df[column] = col_series + chars_to_add
-
-                except Exception as add_ex:
-                    warnings.append(f"文字追加(行 {line_num}): 処理中にエラー: {add_ex}。スキップ: {line}")
-        return df, warnings
-
-    def _process_replace(self, df: pd.DataFrame, warnings: list) -> (pd.DataFrame, list):
-        replace_settings = self.replace_text.get("1.0", tk.END).strip()
-        if replace_settings:
-            for line_num, line in enumerate(replace_settings.split('\n'), 1):
-                line = line.strip()
-                if not line: continue
-                try:
-                    parts = line.split(':', 2)
-                    if len(parts) != 3:
-                        warnings.append(f"文字置換(行 {line_num}): 形式が不正 ('項目:置換前:置換後')。スキップ: {line}"); continue
-
-                    column, old_str, new_str = [p.strip() for p in parts]
-
-                    if not column: warnings.append(f"文字置換(行 {line_num}): 項目名が空。スキップ: {line}"); continue
-                    if not old_str: warnings.append(f"文字置換(行 {line_num}): 置換前文字列が空。スキップ: {line}"); continue
-                    if column not in df.columns: warnings.append(f"文字置換(行 {line_num}): 項目 '{column}' が見つかりません。スキップ。"); continue
-
-                    # fillna('') でNaNを空文字に変換し、astype(str) で文字列型に統一
-                    df[column] = df[column].fillna('').astype(str)
-                    # .loc を使用して、old_str と完全に一致する値のみを new_str に置換
-                    df.loc[df[column] == old_str, column] = new_str
-
-                except Exception as replace_ex:
-                    warnings.append(f"文字置換(行 {line_num}): 処理中にエラー: {replace_ex}。スキップ: {line}")
-        return df, warnings
-
-    def _process_reorder(self, df: pd.DataFrame, warnings: list) -> (pd.DataFrame, list):
-        reorder_settings = self.reorder_text.get("1.0", tk.END).strip()
-        self._empty_col_mapping = {} # 並べ替え前にクリア
-
-        if reorder_settings:
-            specified_columns_with_blanks = [col.strip() for col in reorder_settings.split(',')]
-            final_columns = []
-            new_empty_cols_mapping = {}
-            empty_col_counter = 1
-            current_columns = list(df.columns) # 現在のDFの列リスト
-
-            for col_name in specified_columns_with_blanks:
-                if col_name: # 通常の列名
-                    if col_name in current_columns:
-                        final_columns.append(col_name)
-                    else:
-                        warnings.append(f"並べ替え: 指定された列 '{col_name}' はデータに存在しません。無視します。")
-                else: # 空列を追加 (,, の場合)
-                    # 一意なプレースホルダー名を生成
-                    placeholder_name = f"{self.EMPTY_COLUMN_PLACEHOLDER_PREFIX}{empty_col_counter}"
-                    while placeholder_name in current_columns or placeholder_name in new_empty_cols_mapping:
-                        empty_col_counter += 1
-                        placeholder_name = f"{self.EMPTY_COLUMN_PLACEHOLDER_PREFIX}{empty_col_counter}"
-
-                    df[placeholder_name] = "" # 空列をDataFrameに追加
-                    final_columns.append(placeholder_name)
-                    new_empty_cols_mapping[placeholder_name] = '' # マッピングに追加
-                    current_columns.append(placeholder_name) # 後続の重複チェックのため
-                    empty_col_counter += 1
-
-            if final_columns:
-                try:
-                    # 存在する列のみでDataFrameを再構成
-                    df = df[final_columns]
-                    self._empty_col_mapping = new_empty_cols_mapping # マッピングを保存
-                except KeyError as e:
-                    warnings.append(f"並べ替え: 列の選択中にエラー。存在しない列: {e}。並べ替えは適用されません。")
-                    self._empty_col_mapping = {}
-                except Exception as reorder_ex:
-                    warnings.append(f"並べ替え: 処理中に予期せぬエラー: {reorder_ex}。並べ替えは適用されません。")
-                    self._empty_col_mapping = {}
+    def _apply_detected_encoding(self, selected_encoding, used_encoding):
+        """自動判定した入力文字コードを画面の選択に反映し、ステータス欄に表示する (処理を止めない)"""
+        family = core.encoding_family(used_encoding)
+        if family != selected_encoding:
+            self.encoding.set(family)
+        if used_encoding != selected_encoding:
+            self.status_var.set(f"入力文字コードを {used_encoding} と判定して読み込みました")
+
+    def _on_preview_failed(self, file_path, selected_encoding, error: Exception):
+        if isinstance(error, UnicodeDecodeError):
+            messagebox.showerror("エラー", "UTF-8とShift-JISのどちらでもファイルを読み込めませんでした。\n"
+                                        "ファイルの文字コードを確認してください。")
+        elif isinstance(error, FileNotFoundError):
+            messagebox.showerror("エラー", f"ファイルが見つかりません:\n{file_path}")
+        elif isinstance(error, pd.errors.EmptyDataError):
+            messagebox.showerror("エラー", f"ファイルが空か、CSVデータが含まれていません:\n{file_path}")
+        else:
+            messagebox.showerror("エラー", f"ファイルの読み込み中にエラーが発生しました ({selected_encoding}):\n{str(error)}")
+        self._cleanup_on_error()
+
+    def _show_warnings(self, warnings: list):
+        """処理中の警告を「処理時間・メモリ」タブに表示する (記録は画面と計測結果の JSON 出力に残す)"""
+        self.metrics_warnings_text.config(state=tk.NORMAL)
+        self.metrics_warnings_text.delete("1.0", tk.END)
+        self.metrics_warnings_text.insert("1.0", "\n".join(warnings) or "なし")
+        self.metrics_warnings_text.config(state=tk.DISABLED)
+
+    def _show_metrics(self, operation, input_path, output_path, result: dict):
+        """直近の処理の段階ごとの処理時間・メモリ使用量の増減と警告を「処理時間・メモリ」タブに表示する"""
+        stages = result.get("metrics") or []
+        total_seconds = sum(stage["seconds"] for stage in stages)
+        self._last_metrics = {
+            "operation": operation,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "input_path": input_path,
+            "output_path": output_path,
+            "profile_name": self.current_profile_name.get(),
+            "encoding": result.get("encoding"),
+            "output_encoding": result.get("output_encoding"),
+            "engine": result.get("engine"),
+            "rows": result.get("rows", len(result["preview_df"]) if "preview_df" in result else None),
+            "total_seconds": round(total_seconds, 6),
+            "stages": stages,
+            "warnings": list(result.get("warnings") or []),
+        }
+        # 一括変換では入力ファイルのリストを受け取る
+        name = os.path.basename(input_path) if isinstance(input_path, str) else f"{len(input_path)} 件のファイル"
+        self.metrics_summary_var.set(f"{operation}: {name} (合計 {total_seconds:.3f} 秒)")
+
+        self.metrics_tree.delete(*self.metrics_tree.get_children())
+        for stage in stages:
+            if stage["reused"]:
+                # 設定を変更していないため前回の出力を再利用した段階
+                values = ("再利用", "", "", "", "")
             else:
-                # 並べ替え指定が空、または有効な列が一つもなかった場合
-                if specified_columns_with_blanks: # 何か指定はあったが無効だった
-                    warnings.append("並べ替え: 指定された有効な列がありません。出力は空になります。")
-                df = pd.DataFrame() # 空のDataFrameを返す
-                self._empty_col_mapping = {}
-
-        return df, warnings
+                memory = stage["memory_delta_bytes"]
+                values = (
+                    f"{stage['seconds']:.3f}",
+                    "" if stage["rows_in"] is None else f"{stage['rows_in']:,}",
+                    "" if stage["rows_out"] is None else f"{stage['rows_out']:,}",
+                    "" if stage["columns_out"] is None else (
+                        stage["columns_out"] if stage["columns_in"] in (None, stage["columns_out"])
+                        else f"{stage['columns_in']} → {stage['columns_out']}"),
+                    "-" if memory is None else f"{memory / (1024 * 1024):+.1f}",
+                )
+            self.metrics_tree.insert("", tk.END, text=stage["stage"], values=values)
+
+        self._show_warnings(self._last_metrics["warnings"])
+
+    def export_metrics(self):
+        """表示中の処理時間・メモリの計測結果を JSON ファイルに保存する"""
+        if self._last_metrics is None:
+            messagebox.showinfo("情報", "保存する計測結果がありません。プレビューまたは保存を実行してください。")
+            return
+        output_path = filedialog.asksaveasfilename(
+            title="処理時間・メモリの計測結果を保存",
+            initialfile="metrics.json",
+            defaultextension=".json",
+            filetypes=[("JSONファイル", "*.json"), ("すべてのファイル", "*.*")]
+        )
+        if not output_path:
+            return
+        try:
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(self._last_metrics, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            messagebox.showerror("エラー", f"計測結果の保存中にエラーが発生しました:\n{str(e)}")
+            return
+        self.status_var.set(f"計測結果を保存しました: {output_path}")
 
+    def _preview_row_count(self) -> int:
+        """プレビューに表示する行数を返す (不正な入力の場合は既定値)"""
+        try:
+            return max(1, int(self.preview_rows_var.get()))
+        except (tk.TclError, ValueError):
+            return self.DEFAULT_PREVIEW_ROWS
 
     def update_preview(self):
         try:
@@ -994,6 +931,7 @@ class CSVLayoutTool(TkinterDnD.Tk):
 
             if self.preview_df is None or self.preview_df.empty:
                 # データがない場合はここで終了 (Treeviewは空の状態)
+                self.preview_position_var.set("")
                 return
 
             # 列情報の設定
@@ -1015,7 +953,9 @@ class CSVLayoutTool(TkinterDnD.Tk):
             try:
                 self.tree["columns"] = columns # 内部的な列リスト
                 self.tree["displaycolumns"] = columns
-                self.tree["show"] = "headings" # ヘッダーのみ表示
+                self.tree["show"] = "tree headings" # 先頭の列 (#0) に行番号を表示
+                self.tree.heading("#0", text="行", anchor=tk.E)
+                self.tree.column("#0", width=70, anchor=tk.E, stretch=tk.NO)
 
                 for col in columns: # すべての内部列に対して設定
                     self.tree.heading(col, text=column_headings[col], anchor=tk.W)
@@ -1029,17 +969,9 @@ class CSVLayoutTool(TkinterDnD.Tk):
                  self._cleanup_on_error()
                  return
 
-            # データ表示
+            # データ表示 (表示する範囲の行のみ)
             try:
-                preview_rows = min(10, len(self.preview_df))
-                for i in range(preview_rows):
-                    row_data = self.preview_df.iloc[i]
-                    values = [str(row_data[col]) if pd.notna(row_data[col]) else "" for col in columns]
-                    self.tree.insert("", tk.END, values=values)
-
-                if len(self.preview_df) > 10:
-                    ellipsis_values = ["..."] * len(columns)
-                    self.tree.insert("", tk.END, values=ellipsis_values)
+                self._render_preview_rows()
             except Exception as e:
                 messagebox.showerror("エラー", f"プレビューデータの表示中にエラーが発生しました: {str(e)}")
                 # データ表示エラーの場合もクリア
@@ -1051,6 +983,168 @@ class CSVLayoutTool(TkinterDnD.Tk):
             messagebox.showerror("エラー", f"プレビューの更新中に予期せぬエラーが発生しました: {str(e)}")
             self._cleanup_on_error()
 
+    def _render_preview_rows(self):
+        """
+        表示する範囲の行のみ Treeview に表示する。
+        変換結果全体の行の位置を確認済みの場合は、その範囲のページのみ読み込み・変換する (全行は保持しない)。
+        読み込んでいないページはワーカースレッドで読み込み、完了後に表示する。
+        """
+        visible_rows = self._preview_row_count()
+        if self._paged_result is not None:
+            total = self._paged_result.row_count
+            self._preview_start = max(0, min(self._preview_start, total - visible_rows))
+            rows = self._paged_result.cached_rows(self._preview_start, visible_rows)
+            if rows is None:
+                self._request_preview_rows(self._paged_result, self._preview_start, visible_rows)
+                self.preview_position_var.set(f"{self._preview_start + 1:,} 行目から読み込み中... / 全 {total:,} 行")
+                return
+        else:
+            total = None
+            self._preview_start = 0
+            rows = self.preview_df.iloc[:visible_rows]
+        self._fill_preview_rows(rows, total)
+
+    def _fill_preview_rows(self, rows: pd.DataFrame, total):
+        """Treeview の行を rows (表示中の先頭の行から) に置き換える (total は変換結果全体の行数。不明な場合は None)"""
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        columns = list(self.preview_df.columns)
+        visible_rows = self._preview_row_count()
+
+        for row_number, row in zip(range(self._preview_start, self._preview_start + len(rows)),
+                                   rows[columns].itertuples(index=False, name=None)):
+            values = [str(value) if pd.notna(value) else "" for value in row]
+            self.tree.insert("", tk.END, text=f"{row_number + 1:,}", values=values)
+
+        if total is None:
+            has_more = len(self.preview_df) > visible_rows
+            if has_more:
+                self.tree.insert("", tk.END, text="", values=["..."] * len(columns))
+            self.vsb.set(0, 1)
+            self.preview_position_var.set(f"先頭 {len(rows):,} 行" + (" (続きあり)" if has_more else ""))
+        else:
+            end = self._preview_start + len(rows)
+            self.vsb.set(self._preview_start / total if total else 0, end / total if total else 1)
+            self.preview_position_var.set(f"{self._preview_start + 1:,}〜{end:,} 行目 / 全 {total:,} 行")
+
+    def _request_preview_rows(self, paged_result, start, count):
+        """変換結果の start 行目から count 行をワーカースレッドで読み込み・変換する (結果はキュー経由で表示する)"""
+        with self._page_lock:
+            self._page_request = (paged_result, start, count)
+            if self._page_loading:
+                return # 読み込み中のページの完了後に読み込む
+            self._page_loading = True
+        threading.Thread(target=self._load_preview_rows, daemon=True).start()
+
+    def _load_preview_rows(self):
+        """(ワーカースレッド) 要求された範囲のページを順に読み込み、結果をキューに積む"""
+        while True:
+            with self._page_lock:
+                request = self._page_request
+                self._page_request = None
+                if request is None:
+                    self._page_loading = False
+                    return
+            paged_result, start, count = request
+            try:
+                result = (paged_result.rows(start, count), None)
+            except Exception as e:
+                result = (None, e)
+            self._task_queue.put((None, "page", (paged_result, start, count) + result))
+
+    def _on_preview_rows_loaded(self, paged_result, start, count, rows, error):
+        # 別のファイルを開いた・表示範囲を移動した場合は破棄する (移動先の範囲は別に読み込む)
+        if (paged_result is not self._paged_result or self.preview_df is None
+                or (start, count) != (self._preview_start, self._preview_row_count())):
+            return
+        if error is not None:
+            self.status_var.set(f"プレビューの表示に失敗しました: {error}")
+            return
+        try:
+            self._fill_preview_rows(rows, paged_result.row_count)
+        except Exception as e:
+            self.status_var.set(f"プレビューの表示に失敗しました: {e}")
+
+    def _show_preview_rows(self, start):
+        """変換結果の start 行目 (0始まり) からを表示する"""
+        if self._paged_result is None or self.preview_df is None:
+            return
+        self._preview_start = max(0, int(start))
+        try:
+            self._render_preview_rows()
+        except Exception as e:
+            self.status_var.set(f"プレビューの表示に失敗しました: {e}")
+
+    def _bind_preview_scroll(self):
+        """マウスホイールによるスクロールを表示範囲の移動として扱う"""
+        self.tree.bind("<MouseWheel>", lambda event: self._on_preview_wheel(-1 if event.delta > 0 else 1))
+        self.tree.bind("<Button-4>", lambda event: self._on_preview_wheel(-1))
+        self.tree.bind("<Button-5>", lambda event: self._on_preview_wheel(1))
+
+    def _on_preview_wheel(self, direction):
+        if self._paged_result is None:
+            return None # Treeview 標準のスクロール
+        self._on_preview_scroll("scroll", direction * 3, "units")
+        return "break"
+
+    def _on_tree_yscroll(self, first, last):
+        # ページ表示中はスクロールバーの位置を変換結果全体に対する表示範囲で設定する
+        if self._paged_result is None:
+            self.vsb.set(first, last)
+
+    def _on_preview_scroll(self, *args):
+        """縦スクロールバーの操作 ("moveto", 位置) / ("scroll", 量, 単位) を表示範囲の移動に変換する"""
+        if self._paged_result is None:
+            self.tree.yview(*args)
+            return
+        visible_rows = self._preview_row_count()
+        if args[0] == "moveto":
+            start = int(float(args[1]) * self._paged_result.row_count)
+        elif args[0] == "scroll":
+            step = visible_rows if args[2] == "pages" else 1
+            start = self._preview_start + int(args[1]) * step
+        else:
+            return
+        if start != self._preview_start:
+            self._show_preview_rows(start)
+
+    def _goto_preview_row(self):
+        """入力された行番号 (1始まり) の行から表示する"""
+        try:
+            row_number = int(self.goto_row_var.get().replace(",", "").strip())
+        except ValueError:
+            messagebox.showerror("エラー", "行番号を数値で入力してください")
+            return
+        if self.preview_df is None:
+            messagebox.showerror("エラー", "プレビューするCSVファイルが選択されていません")
+            return
+        if self._paged_result is None:
+            if row_number > self._preview_row_count() and len(self.preview_df) > self._preview_row_count():
+                messagebox.showinfo("情報", "ファイル全体の行数を確認中です。完了後に再度お試しください。")
+            return
+        self._show_preview_rows(row_number - 1)
+
+    def _start_paged_preview(self, file_path, encoding, profile):
+        """ファイル全体の行の位置を調べ (ワーカースレッド)、変換結果全体をページ表示できるようにする"""
+        row_index = self._row_index
+        self._start_task(
+            "paging",
+            lambda progress, cancel_event: core.PagedResult(
+                file_path, encoding, profile, row_index=row_index,
+                tracker=core.ProgressTracker(progress, cancel_event)),
+            on_done=self._on_paged_result_loaded,
+            on_error=lambda error: self.status_var.set(f"ファイル全体の行数を確認できませんでした: {error}"),
+            status_text="ファイル全体の行数を確認しています..."
+        )
+
+    def _on_paged_result_loaded(self, paged_result):
+        if self.preview_df is None:
+            return
+        self._paged_result = paged_result
+        self._row_index = paged_result.row_index
+        self.status_var.set(f"全 {paged_result.row_count:,} 行 (スクロールまたは行番号の指定で表示できます)")
+        self._show_preview_rows(self._preview_start)
+
     def process_and_save(self):
         if not self.current_file:
             messagebox.showerror("エラー", "処理するCSVファイルが選択されていません")
@@ -1062,43 +1156,352 @@ class CSVLayoutTool(TkinterDnD.Tk):
              else:
                  if not messagebox.askyesno("確認", "処理結果が空ですが、空のファイルとして保存しますか？"):
                      return
-                 processed_df_to_save = pd.DataFrame()
-        else:
-            processed_df_preview = self.preview_df.copy()
-            empty_col_mapping = getattr(self, '_empty_col_mapping', {})
-            rename_dict = {ph: '' for ph in empty_col_mapping if ph in processed_df_preview.columns}
-            processed_df_to_save = processed_df_preview.rename(columns=rename_dict) if rename_dict else processed_df_preview
-
 
         try:
-            base_name = os.path.basename(self.current_file)
-            name, ext = os.path.splitext(base_name)
             output_path = filedialog.asksaveasfilename(
                 title="変換後のファイルを保存",
-                initialfile=f"{name}_converted{ext}",
+                initialfile=os.path.basename(core.converted_output_path(self.current_file)),
                 defaultextension=".csv",
-                filetypes=[("CSVファイル", "*.csv"), ("すべてのファイル", "*.*")]
+                filetypes=[("CSVファイル", "*.csv"), ("圧縮CSVファイル", "*.csv.gz *.csv.bz2 *.csv.xz"),
+                           ("すべてのファイル", "*.*")]
             )
 
             if output_path:
-                selected_output_encoding = self.output_encoding.get()
-                output_header = not self.remove_header_var.get()
-                try:
-                    processed_df_to_save.to_csv(
-                        output_path,
-                        index=False,
-                        encoding=selected_output_encoding,
-                        header=output_header,
-                        quoting=csv.QUOTE_ALL
-                    )
-                    messagebox.showinfo("成功", f"ファイルを保存しました:\n{output_path}")
-                except Exception as e:
-                     messagebox.showerror("保存エラー", f"ファイルの保存中にエラーが発生しました (エンコーディング: {selected_output_encoding}):\n{str(e)}")
+                self._save_converted(output_path)
 
         except Exception as e:
             messagebox.showerror("エラー", f"処理と保存中に予期せぬエラーが発生しました: {str(e)}")
 
+    def _save_converted(self, output_path):
+        """
+        元ファイル全体をワーカースレッドで読み込み、変換して保存する (プレビューは先頭の数行のみのため)。
+        分割保存がオンの場合は分割して読み込み、変換結果を順次追記する。
+        """
+        current_file = self.current_file
+        profile = self._collect_profile_settings()
+        selected_encoding = self.encoding.get()
+        selected_output_encoding = self.output_encoding.get()
+        chunksize = core.DEFAULT_CHUNKSIZE if self.stream_save_var.get() else None
+        # UTF-8 以外・分割保存時・PyArrow 未導入の場合は pandas 標準の処理になる
+        engine = core.ENGINE_PYARROW if self.arrow_engine_var.get() else core.ENGINE_C
+        memory_map = self.memory_map_var.get()
+        # 並列変換は圧縮ファイル・小さいファイルでは行わない (その場合は上記の設定で保存する)
+        workers = os.cpu_count() if self.parallel_var.get() else None
+
+        self._start_task(
+            "save",
+            lambda progress, cancel_event: core.convert_file(
+                current_file, output_path, profile, selected_encoding, selected_output_encoding,
+                chunksize=chunksize, progress=progress, cancel_event=cancel_event, engine=engine,
+                memory_map=memory_map, workers=workers),
+            on_done=lambda result: self._on_save_finished(output_path, selected_encoding, selected_output_encoding, result),
+            on_error=lambda error: self._on_save_failed(selected_output_encoding, error),
+            status_text="変換して保存しています..."
+        )
+
+    def _on_save_finished(self, output_path, selected_encoding, selected_output_encoding, result: dict):
+        self._show_metrics("保存", result["input_path"], output_path, result)
+        self._apply_detected_encoding(selected_encoding, result["encoding"])
+        self.status_var.set(f"保存しました ({result['rows']:,} 行, 入力文字コード: {result['encoding']})")
+        message = f"ファイルを保存しました ({result['rows']} 行):\n{output_path}"
+        if result["output_encoding"] != selected_output_encoding:
+            # Windowsの拡張文字 (①、㈱ など) を含むため cp932 で書き出した場合
+            message += f"\n\n出力文字コード: {result['output_encoding']}"
+        messagebox.showinfo("成功", message)
+
+    def _on_save_failed(self, selected_output_encoding, error: Exception):
+        self.status_var.set("保存に失敗しました")
+        if isinstance(error, core.ConversionError):
+            messagebox.showerror("保存エラー", str(error))
+        else:
+            messagebox.showerror("保存エラー", f"ファイルの保存中にエラーが発生しました (エンコーディング: {selected_output_encoding}):\n{str(error)}")
+
+    # --- 一括変換 ---
+
+    def _confirm_batch(self, dropped_paths):
+        """ドロップされたファイル・フォルダ (直下の CSV ファイル。圧縮・ZIP を含む) を確認のうえ一括変換する"""
+        if self._is_saving():
+            messagebox.showwarning("処理中", "保存処理の実行中です。完了またはキャンセルしてから操作してください。")
+            return
+        file_paths = []
+        skipped = []
+        for path in core.expand_inputs(dropped_paths):
+            if os.path.isfile(path) and core.is_csv_input(path):
+                file_paths.append(path)
+            else:
+                skipped.append(path)
+        if not file_paths:
+            messagebox.showerror("エラー", "変換できるCSVファイルがありません")
+            return
+
+        profile_name = self.current_profile_name.get() or "(未保存の設定)"
+        message = (f"{len(file_paths)} 件のCSVファイルをプロファイル「{profile_name}」で変換します。\n"
+                   f"変換結果は各ファイルと同じフォルダに「元のファイル名{core.CONVERTED_SUFFIX}.csv」として保存します。")
+        if skipped:
+            message += f"\n\nCSVファイルでないため {len(skipped)} 件を除外します。"
+        if messagebox.askyesno("一括変換", message):
+            self._start_batch(file_paths)
+
+    def _start_batch(self, file_paths):
+        """複数のファイルを現在の設定で並列に変換し、ファイルごとの状態を一括変換ウィンドウに表示する"""
+        profile = self._collect_profile_settings()
+        selected_encoding = self.encoding.get()
+        selected_output_encoding = self.output_encoding.get()
+        chunksize = core.DEFAULT_CHUNKSIZE if self.stream_save_var.get() else None
+        engine = core.ENGINE_PYARROW if self.arrow_engine_var.get() else core.ENGINE_C
+        memory_map = self.memory_map_var.get()
+
+        self._open_batch_window(file_paths)
+        self._start_task(
+            "batch",
+            lambda progress, cancel_event, notify: core.convert_files(
+                file_paths, profile, selected_encoding, selected_output_encoding,
+                chunksize=chunksize, engine=engine, cancel_event=cancel_event, memory_map=memory_map,
+                on_start=lambda index: notify((index, None)),
+                on_file=lambda index, result: notify((index, result))),
+            on_done=self._on_batch_finished,
+            on_error=self._on_batch_failed,
+            status_text=f"{len(file_paths)} 件のファイルを変換しています...",
+            on_item=self._on_batch_item
+        )
+
+    def _open_batch_window(self, file_paths):
+        """ファイルごとの変換状態を表示するウィンドウを開く (前回のウィンドウは閉じる)"""
+        if self._batch_window is not None and self._batch_window.winfo_exists():
+            self._batch_window.destroy()
+
+        window = tk.Toplevel(self)
+        window.title(f"一括変換 ({len(file_paths)} 件)")
+        window.geometry("700x450")
+
+        frame = ttk.Frame(window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        vsb = ttk.Scrollbar(frame, orient="vertical")
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        tree = ttk.Treeview(frame, columns=("file", "status", "rows", "detail"), show="headings",
+                            yscrollcommand=vsb.set)
+        vsb.config(command=tree.yview)
+        for column, heading, width in (("file", "ファイル", 200), ("status", "状態", 70),
+                                       ("rows", "行数", 80), ("detail", "警告・エラー", 320)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor=tk.E if column == "rows" else tk.W)
+        for index, file_path in enumerate(file_paths):
+            tree.insert("", tk.END, iid=str(index), values=(os.path.basename(file_path), "待機中", "", ""))
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        # ファイルごとの警告・エラーの内容 (完了した順に追加する)
+        ttk.Label(window, text="警告・エラーの内容:").pack(anchor=tk.W, padx=5)
+        detail_text = ScrolledText(window, height=6, wrap=tk.WORD, state=tk.DISABLED)
+        detail_text.pack(fill=tk.X, padx=5)
+
+        ttk.Label(window, textvariable=self._batch_summary_var, anchor=tk.W).pack(fill=tk.X, padx=5)
+        ttk.Button(window, text="閉じる", command=window.destroy).pack(side=tk.RIGHT, padx=5, pady=5)
+
+        self._batch_summary_var.set(f"0 / {len(file_paths)} 件完了")
+        self._batch_window = window
+        self._batch_tree = tree
+        self._batch_detail_text = detail_text
+
+    def _batch_tree_available(self) -> bool:
+        return self._batch_window is not None and self._batch_window.winfo_exists()
+
+    def _on_batch_item(self, item):
+        """ファイルごとの処理開始・完了の通知を一括変換ウィンドウに反映する"""
+        index, result = item
+        if not self._batch_tree_available():
+            return # ウィンドウが閉じられた (変換は続行する)
+        if result is None:
+            self._batch_tree.set(str(index), "status", "変換中")
+            return
+        file_name = os.path.basename(result["input_path"])
+        if result["error"] is not None:
+            self._batch_tree.item(str(index), values=(file_name, "失敗", "", result["error"]))
+            self._append_batch_detail([f"{file_name}: 失敗: {result['error']}"])
+        else:
+            warnings = result["warnings"]
+            detail = ""
+            if warnings:
+                detail = warnings[0] if len(warnings) == 1 else f"警告 {len(warnings)} 件: {warnings[0]} ..."
+            self._batch_tree.item(str(index), values=(file_name, "完了", f"{result['rows']:,}", detail))
+            self._append_batch_detail([f"{file_name}: {warn}" for warn in warnings])
+        self._batch_tree.see(str(index))
+        done = sum(1 for iid in self._batch_tree.get_children()
+                   if self._batch_tree.set(iid, "status") in ("完了", "失敗"))
+        total = len(self._batch_tree.get_children())
+        self._batch_summary_var.set(f"{done} / {total} 件完了")
+        self.status_var.set(f"一括変換: {done} / {total} 件完了")
+
+    def _append_batch_detail(self, lines: list):
+        """一括変換ウィンドウの警告・エラーの欄に行を追加する"""
+        if not lines:
+            return
+        self._batch_detail_text.config(state=tk.NORMAL)
+        self._batch_detail_text.insert(tk.END, "\n".join(lines) + "\n")
+        self._batch_detail_text.see(tk.END)
+        self._batch_detail_text.config(state=tk.DISABLED)
+
+    def _mark_batch_cancelled(self):
+        """キャンセル時、完了していないファイルの状態を「中止」にする"""
+        self._batch_summary_var.set("キャンセルしました")
+        if not self._batch_tree_available():
+            return
+        for iid in self._batch_tree.get_children():
+            if self._batch_tree.set(iid, "status") in ("待機中", "変換中"):
+                self._batch_tree.set(iid, "status", "中止")
+
+    def _on_batch_finished(self, results: list):
+        succeeded = [result for result in results if result["error"] is None]
+        failed = [result for result in results if result["error"] is not None]
+        warning_count = sum(len(result["warnings"]) for result in succeeded)
+        # 成功したファイルの計測を合計し、警告・失敗の内容とともに「処理時間・メモリ」タブに表示する
+        metrics = core.StageMetrics()
+        metrics.merge([stage for result in succeeded for stage in result.get("metrics") or []])
+        warnings = [f"{os.path.basename(result['input_path'])}: {warn}" for result in succeeded for warn in result["warnings"]]
+        warnings += [f"{os.path.basename(result['input_path'])}: 失敗: {result['error']}" for result in failed]
+        self._show_metrics("一括変換", [result["input_path"] for result in results], None, {
+            "metrics": metrics.to_list(), "warnings": warnings, "rows": sum(result["rows"] for result in succeeded)})
+
+        summary = f"成功: {len(succeeded)} 件 / 失敗: {len(failed)} 件 / 警告: {warning_count} 件"
+        self._batch_summary_var.set(summary)
+        self.status_var.set(f"一括変換が完了しました ({summary})")
+        message = f"一括変換が完了しました。\n{summary}"
+        if warning_count:
+            message += "\n\n警告の内容は一括変換ウィンドウと「処理時間・メモリ」タブに表示しています。"
+        if failed:
+            message += "\n\n失敗したファイル:\n" + "\n".join(
+                f"- {os.path.basename(result['input_path'])}: {result['error']}" for result in failed[:10])
+            if len(failed) > 10:
+                message += f"\n... ほか {len(failed) - 10} 件"
+            messagebox.showwarning("一括変換", message)
+        else:
+            messagebox.showinfo("一括変換", message)
+
+    def _on_batch_failed(self, error: Exception):
+        self.status_var.set("一括変換に失敗しました")
+        messagebox.showerror("一括変換エラー", f"一括変換中にエラーが発生しました:\n{str(error)}")
+
+    # --- バックグラウンド処理 ---
+
+    def _is_saving(self) -> bool:
+        return self._task_kind in ("save", "batch")
+
+    def _start_task(self, kind, work, on_done, on_error, status_text, on_item=None):
+        """
+        work(progress, cancel_event) をワーカースレッドで実行する。
+        進捗と結果はキューに積まれ、_poll_task_queue によりメインスレッドで on_done / on_error が呼ばれる。
+        on_item を指定した場合は work(progress, cancel_event, notify) として実行し、
+        notify(item) で通知した item ごとにメインスレッドで on_item(item) が呼ばれる。
+        """
+        if self._is_saving():
+            messagebox.showwarning("処理中", "保存処理の実行中です。完了またはキャンセルしてから操作してください。")
+            return
+        if self._cancel_event is not None:
+            # 実行中のプレビューは中止し、その結果は破棄する
+            self._cancel_event.set()
+
+        self._task_id += 1
+        task_id = self._task_id
+        cancel_event = threading.Event()
+        self._cancel_event = cancel_event
+        self._task_kind = kind
+        self._task_callbacks = (on_done, on_error, on_item)
+
+        def progress(stage, rows_read, rows_written):
+            self._task_queue.put((task_id, "progress", (stage, rows_read, rows_written)))
+
+        def notify(item):
+            self._task_queue.put((task_id, "item", item))
+
+        def run():
+            try:
+                result = work(progress, cancel_event) if on_item is None else work(progress, cancel_event, notify)
+                self._task_queue.put((task_id, "done", result))
+            except core.ConversionCancelled:
+                self._task_queue.put((task_id, "cancelled", None))
+            except Exception as e:
+                self._task_queue.put((task_id, "error", e))
+
+        threading.Thread(target=run, daemon=True).start()
+
+        self.status_var.set(status_text)
+        self.progress_bar.start(10)
+        self.cancel_button.config(state=tk.NORMAL)
+        if kind in ("save", "batch"):
+            self.save_button.config(state=tk.DISABLED)
+
+    def _finish_task(self):
+        self._task_kind = None
+        self._task_callbacks = None
+        self._cancel_event = None
+        self.progress_bar.stop()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.save_button.config(state=tk.NORMAL)
+
+    def _poll_task_queue(self):
+        """ワーカースレッドからの通知を処理する (after() で定期的に呼び出される)"""
+        try:
+            while True:
+                try:
+                    task_id, kind, payload = self._task_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == "page":
+                    self._on_preview_rows_loaded(*payload) # タスクとは別に読み込んだプレビューのページ
+                    continue
+                if task_id != self._task_id:
+                    continue # 中止されたタスクからの通知は無視する
+
+                if kind == "progress":
+                    stage, rows_read, rows_written = payload
+                    self.status_var.set(f"{stage}: 読み込み {rows_read:,} 行 / 書き込み {rows_written:,} 行")
+                    continue
+                if kind == "item":
+                    self._task_callbacks[2](payload)
+                    continue
+
+                task_kind = self._task_kind
+                on_done, on_error, _ = self._task_callbacks
+                self._finish_task()
+                if self._close_requested:
+                    self.destroy()
+                    return
+                if kind == "done":
+                    on_done(payload)
+                elif kind == "error":
+                    on_error(payload)
+                else:
+                    if task_kind == "save":
+                        self.status_var.set("キャンセルしました (書き出し途中のファイルは削除しました)")
+                    elif task_kind == "batch":
+                        self.status_var.set("キャンセルしました (変換が完了したファイルは保存済みです)")
+                        self._mark_batch_cancelled()
+                    elif task_kind == "paging":
+                        self.status_var.set("キャンセルしました (先頭の行のみ表示します)")
+                    else:
+                        self.status_var.set("キャンセルしました")
+                        self._cleanup_on_error()
+        except Exception as e:
+            print(f"警告: バックグラウンド処理の結果の反映中にエラー: {e}")
+        self.after(self.TASK_POLL_INTERVAL_MS, self._poll_task_queue)
+
+    def cancel_task(self):
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+            self.status_var.set("キャンセルしています...")
+
+    def _on_close(self):
+        if self._is_saving():
+            if not messagebox.askyesno("確認", "保存処理の実行中です。中止して終了しますか？"):
+                return
+            # ワーカーが書き出し途中のファイルを削除してから終了する
+            self._close_requested = True
+            self.cancel_task()
+            return
+        self.destroy()
+
 
 if __name__ == "__main__":
+    # 一括変換のワーカープロセス用 (PyInstaller で作成した実行ファイルで必要)
+    multiprocessing.freeze_support()
     app = CSVLayoutTool()
     app.mainloop()
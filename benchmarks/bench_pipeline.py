@@ -0,0 +1,183 @@
+"""変換処理全体のベンチマーク
+
+合成データ (benchmarks/sample_data.py) を行数・文字コードごとに作成し、
+読み込み、各段階の処理 (CSVLayoutProcessor の _process_*)、DataFrame の組み立て、
+書き出し (全項目を引用符で囲む write_csv) の処理時間を個別に計測して JSON に記録する。
+--compare に以前の結果を指定すると、処理時間が閾値を超えて増えた項目を報告する (該当があれば終了コード 1)。
+
+使用例:
+    python benchmarks/bench_pipeline.py --rows 10000 100000 1000000 --output bench.json
+    python benchmarks/bench_pipeline.py --rows 100000 --compare bench.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import csv_layout_core as core  # noqa: E402
+from sample_data import write_sample_csv  # noqa: E402
+
+# すべての段階を通る変換設定 (合成データの項目に合わせる)
+BENCH_PROFILE = {
+    "get_pref_code": {"enabled": True, "source_column": "住所", "new_column": "都道府県コード"},
+    "remove_prefecture": {"enabled": True, "column": "住所"},
+    "extract": "郵便番号上3桁:郵便番号:1:3\n商品番号:商品コード:4:5",
+    "remove": "電話番号:-\n郵便番号:-",
+    "add": "顧客コード:後:-01\n数量:後:個",
+    "replace": "ステータス:処理中:未完了\nステータス:キャンセル:取消",
+    "merge": "氏名:姓,名, \n連絡先:郵便番号,住所,電話番号,/",
+    "reorder": "顧客コード,氏名,都道府県コード,住所,郵便番号上3桁,連絡先,,商品番号,数量,ステータス,備考",
+    "remove_header": False,
+}
+# 比較時、以前の結果がこの秒数未満の項目は誤差が大きいため判定しない
+MIN_COMPARE_SECONDS = 0.05
+
+
+def sample_path(data_dir: str, rows: int, encoding: str, seed: int) -> str:
+    """合成データのファイル (作成済みなら再利用する)"""
+    path = os.path.join(data_dir, f"bench_{rows}_{encoding}_{seed}.csv")
+    if not os.path.exists(path):
+        print(f"合成データを作成中: {path}", file=sys.stderr)
+        write_sample_csv(path + ".tmp", rows, encoding, seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def time_conversion(input_path: str, encoding: str, output_path: str) -> dict:
+    """読み込み・各段階・組み立て・書き出しの処理時間 (秒) を計測する"""
+    timings = {}
+
+    start = time.perf_counter()
+    df = core.read_csv(input_path, encoding)
+    timings["read"] = time.perf_counter() - start
+
+    # 段階ごとに計測するため、列の処理はスレッドで並行して実行しない
+    processor = core.CSVLayoutProcessor(BENCH_PROFILE, threads=1)
+    stage_methods = [method_name for _, method_name, _ in processor.STAGES]
+    for method_name in stage_methods:
+        # process_dataframe は getattr で段階の処理を呼び出すため、インスタンスの属性で計測用に差し替える
+        def timed(columns, warnings, method=getattr(processor, method_name), name=method_name):
+            stage_start = time.perf_counter()
+            try:
+                return method(columns, warnings)
+            finally:
+                timings[name] = time.perf_counter() - stage_start
+        setattr(processor, method_name, timed)
+
+    start = time.perf_counter()
+    result = processor.process_dataframe(df)
+    process_sec = time.perf_counter() - start
+    timings["_build_dataframe"] = process_sec - sum(timings[name] for name in stage_methods)
+
+    output_df = core.prepare_output_frame(result, processor.empty_col_mapping)
+    start = time.perf_counter()
+    core.write_csv(output_df, output_path, encoding)
+    timings["write"] = time.perf_counter() - start
+
+    timings["total"] = timings["read"] + process_sec + timings["write"]
+    return timings
+
+
+def run(rows_list: list, encodings: list, data_dir: str, seed: int, repeat: int) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for rows in rows_list:
+            for encoding in encodings:
+                input_path = sample_path(data_dir, rows, encoding, seed)
+                output_path = os.path.join(output_dir, "output.csv")
+                # 複数回計測した場合は項目ごとの最小値を記録する
+                runs = [time_conversion(input_path, encoding, output_path) for _ in range(repeat)]
+                timings = {key: round(min(run[key] for run in runs), 4) for key in runs[0]}
+                results.append({
+                    "rows": rows,
+                    "encoding": encoding,
+                    "file_bytes": os.path.getsize(input_path),
+                    "timings": timings,
+                })
+                print_result(results[-1])
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "pyarrow": core.pa.__version__ if core.pa is not None else None,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def print_result(result: dict):
+    print(f"{result['rows']:>10,} 行 {result['encoding']:<10}", end="")
+    print("  ".join(f"{key}={seconds:.3f}" for key, seconds in result["timings"].items()))
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """以前の結果より処理時間が (1 + threshold) 倍を超えて増えた項目を返す"""
+    baseline_results = {(result["rows"], result["encoding"]): result["timings"] for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        previous = baseline_results.get((result["rows"], result["encoding"]))
+        if previous is None:
+            continue
+        for key, seconds in result["timings"].items():
+            before = previous.get(key)
+            if before is None or before < MIN_COMPARE_SECONDS:
+                continue
+            if seconds > before * (1 + threshold):
+                regressions.append({"rows": result["rows"], "encoding": result["encoding"], "item": key,
+                                    "before": before, "after": seconds, "ratio": round(seconds / before, 2)})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="計測する行数 (複数指定可, 10000〜10000000 程度)")
+    parser.add_argument("--encodings", nargs="+", default=["utf-8", "shift_jis"], choices=["utf-8", "shift_jis"])
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "csv_layout_bench"),
+                        help="合成データの保存先 (作成済みのデータは再利用する)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="計測の回数 (項目ごとの最小値を記録する)")
+    parser.add_argument("--output", help="結果を保存する JSON ファイル")
+    parser.add_argument("--compare", metavar="JSON", help="比較する以前の結果")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="処理時間の増加を報告する割合 (既定: 0.2 = 20%%増)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    report = run(args.rows, args.encodings, args.data_dir, args.seed, max(1, args.repeat))
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["compared_with"] = args.compare
+        report["regressions"] = compare(report, baseline, args.threshold)
+        for item in report["regressions"]:
+            print(f"遅くなった項目: {item['rows']:,} 行 {item['encoding']} {item['item']}: "
+                  f"{item['before']:.3f} → {item['after']:.3f} 秒 ({item['ratio']} 倍)")
+        if report["regressions"]:
+            exit_code = 1
+        else:
+            print(f"処理時間が {args.threshold:.0%} を超えて増えた項目はありません")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"保存: {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""ベンチマーク用の合成CSVデータ (日本語の顧客・受注データ) の作成
+
+都道府県を含む住所、氏名、電話番号、郵便番号、商品コードなどの項目を持つCSVを作成する。
+行数が多い場合も一定のメモリ使用量で作成できるよう、分割して追記する。
+
+使用例:
+    python benchmarks/sample_data.py --rows 1000000 --encoding shift_jis sample_sjis.csv
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from csv_layout_core import PREFECTURES  # noqa: E402
+
+# 1回に作成・追記する行数
+CHUNK_ROWS = 100000
+
+# Shift-JIS で表現できる文字のみを使う (髙 などの cp932 の拡張文字は含めない)
+LAST_NAMES = ["佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "山本", "中村", "小林", "加藤",
+              "吉田", "山田", "佐々木", "山口", "松本", "井上", "木村", "斎藤", "清水", "長谷川"]
+FIRST_NAMES = ["太郎", "花子", "一郎", "美咲", "翔太", "陽菜", "大輔", "由美", "健", "さくら",
+               "拓也", "愛", "直樹", "結衣", "誠", "真由美", "悠斗", "彩", "博", "明日香"]
+CITIES = ["中央区", "北区", "港区", "千代田区", "横浜市西区", "札幌市中央区", "名古屋市中区", "福岡市博多区",
+          "大阪市北区", "仙台市青葉区", "さいたま市浦和区", "京都市下京区", "那覇市", "松江市", "金沢市"]
+TOWNS = ["本町", "栄町", "緑が丘", "桜台", "旭町", "大手町", "駅前通り", "新町", "東雲", "若葉"]
+STATUSES = ["処理中", "完了", "保留", "キャンセル"]
+REMARKS = ["", "", "", "至急", "午前指定", "不在時は宅配ボックス", "備考, カンマあり", "\"引用\"を含む", "改行\nあり"]
+
+
+def generate_frame(rows: int, start: int = 0, seed: int = 0) -> pd.DataFrame:
+    """start 行目から rows 行分のデータを作成する (同じ seed・start なら同じ内容)"""
+    rng = np.random.default_rng([seed, start])
+    number = np.arange(start, start + rows)
+
+    def pick(values):
+        return pd.Series(np.asarray(values, dtype=object)[rng.integers(0, len(values), rows)])
+
+    def digits(low, high, width):
+        return pd.Series(rng.integers(low, high, rows)).astype(str).str.zfill(width)
+
+    # 住所の1割は都道府県名を省略する
+    prefectures = pick(PREFECTURES).where(rng.random(rows) >= 0.1, "")
+    return pd.DataFrame({
+        "顧客コード": "C" + pd.Series(number).astype(str).str.zfill(8),
+        "姓": pick(LAST_NAMES),
+        "名": pick(FIRST_NAMES),
+        "郵便番号": digits(0, 1000, 3) + "-" + digits(0, 10000, 4),
+        "住所": prefectures + pick(CITIES) + pick(TOWNS) + digits(1, 10, 1) + "-" + digits(1, 30, 1) + "-" + digits(1, 20, 1),
+        "電話番号": "0" + digits(1, 100, 2) + "-" + digits(0, 10000, 4) + "-" + digits(0, 10000, 4),
+        "商品コード": "AB-" + digits(0, 100000, 5),
+        "数量": digits(1, 100, 1),
+        "ステータス": pick(STATUSES),
+        "備考": pick(REMARKS),
+    })
+
+
+def write_sample_csv(path: str, rows: int, encoding: str = "utf-8", seed: int = 0, chunk_rows: int = CHUNK_ROWS):
+    """rows 行のCSVを作成する (chunk_rows 行ずつ追記するため、メモリ使用量は行数によらない)"""
+    with open(path, "w", encoding=encoding, newline="") as f:
+        for start in range(0, max(rows, 1), chunk_rows):
+            chunk = generate_frame(min(chunk_rows, rows - start), start, seed)
+            chunk.to_csv(f, index=False, header=start == 0, lineterminator="\r\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="作成するCSVファイル")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--encoding", default="utf-8", choices=["utf-8", "shift_jis"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    write_sample_csv(args.output, args.rows, args.encoding, args.seed)
+    print(f"作成: {args.output} ({args.rows:,} 行, {args.encoding}, {os.path.getsize(args.output):,} バイト)")
+
+
+if __name__ == "__main__":
+    main()
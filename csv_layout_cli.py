@@ -0,0 +1,107 @@
+"""CSVレイアウト変更ツール (バッチ実行)
+
+保存済みプロファイルを使用して、GUIを起動せずにCSVファイルを変換する。
+tkinter / tkinterdnd2 は読み込まない。
+
+使用例:
+    python csv_layout_cli.py --profile 顧客マスタ input1.csv input2.csv
+    python csv_layout_cli.py -p 顧客マスタ --output-dir out/ data/
+    python csv_layout_cli.py -p 顧客マスタ --chunksize 100000 huge.csv
+    python csv_layout_cli.py -p 顧客マスタ --compress gz input.csv
+    python csv_layout_cli.py -p 顧客マスタ --memory-map huge.csv
+    python csv_layout_cli.py -p 顧客マスタ --workers 8 huge.csv
+"""
+import argparse
+import os
+import sys
+
+from csv_layout_core import (
+    DEFAULT_CHUNKSIZE, ENGINE_C, ENGINES, PROFILE_FILENAME, ConversionError, compile_profile,
+    converted_output_path, convert_file, expand_inputs, load_profiles
+)
+
+ENCODING_CHOICES = ["utf-8", "shift_jis"]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="保存済みプロファイルでCSVファイルのレイアウトを一括変換します。"
+    )
+    parser.add_argument("inputs", nargs="+",
+                        help="入力CSVファイル (.csv.gz / .csv.bz2 / .csv.xz / .zip も可。"
+                             "フォルダを指定した場合は直下の *.csv とその圧縮ファイルを対象)")
+    parser.add_argument("-p", "--profile", required=True, help="使用するプロファイル名")
+    parser.add_argument("--profiles-file", default=PROFILE_FILENAME,
+                        help=f"プロファイル設定ファイル (既定: {PROFILE_FILENAME})")
+    parser.add_argument("--encoding", default="shift_jis", choices=ENCODING_CHOICES,
+                        help="入力文字コード (既定: shift_jis)")
+    parser.add_argument("--output-encoding", default="shift_jis", choices=ENCODING_CHOICES,
+                        help="出力文字コード (既定: shift_jis)")
+    parser.add_argument("-o", "--output-dir", default=None,
+                        help="出力先フォルダ (既定: 入力ファイルと同じフォルダ)")
+    parser.add_argument("--chunksize", type=int, default=0, metavar="N",
+                        help="N行ずつ読み込み・変換・追記してメモリ使用量を抑える "
+                             f"(0: 一括処理, 目安: {DEFAULT_CHUNKSIZE})")
+    parser.add_argument("--engine", default=ENGINE_C, choices=ENGINES,
+                        help="読み込み・書き出しエンジン (pyarrow: PyArrowで高速に処理。UTF-8の一括処理のみ有効で、"
+                             "それ以外は pandas 標準の処理になる。既定: c)")
+    parser.add_argument("--memory-map", action="store_true",
+                        help="入力ファイルをメモリマップし、PyArrowで直接解析して読み込む (大容量ファイル向け。"
+                             "PyArrow が未導入の場合・圧縮ファイルは pandas 標準の読み込みになる)")
+    parser.add_argument("--workers", type=int, default=0, metavar="N",
+                        help="1つのファイルを行の区切りで分割し、N個のプロセスで並列に変換する "
+                             "(0: 並列に変換しない。圧縮ファイル・小さいファイルは通常の処理になる)")
+    parser.add_argument("--compress", choices=["gz", "bz2", "xz"], default=None,
+                        help="出力ファイルを圧縮する (出力ファイル名の末尾に .gz / .bz2 / .xz を付ける)")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    try:
+        profiles = load_profiles(args.profiles_file)
+    except Exception as e:
+        print(f"エラー: プロファイルの読み込みに失敗しました: {e}", file=sys.stderr)
+        return 2
+    if args.profile not in profiles:
+        print(f"エラー: プロファイル「{args.profile}」が見つかりません ({args.profiles_file})", file=sys.stderr)
+        return 2
+    # プロファイルの解析・検証は1回だけ行い、設定の誤りは最初にまとめて表示する
+    plan = compile_profile(profiles[args.profile])
+    for error in plan.errors:
+        print(f"警告: プロファイル「{args.profile}」: {error}", file=sys.stderr)
+    plan_errors = set(plan.errors)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    failed = 0
+    for input_path in expand_inputs(args.inputs):
+        output_path = converted_output_path(input_path, args.output_dir)
+        if args.compress:
+            output_path += f".{args.compress}"
+        try:
+            result = convert_file(input_path, output_path, plan, args.encoding, args.output_encoding,
+                                  chunksize=args.chunksize or None, engine=args.engine,
+                                  memory_map=args.memory_map, workers=args.workers or None)
+        except ConversionError as e:
+            failed += 1
+            print(f"失敗: {input_path}: {e}", file=sys.stderr)
+            continue
+        except Exception as e:
+            failed += 1
+            print(f"失敗: {input_path}: 処理中に予期せぬエラーが発生しました: {e}", file=sys.stderr)
+            continue
+
+        for warn in result["warnings"]:
+            if warn in plan_errors:
+                continue # 表示済み
+            print(f"警告: {input_path}: {warn}", file=sys.stderr)
+        print(f"保存: {output_path} ({result['rows']} 行, 入力文字コード: {result['encoding']}, エンジン: {result['engine']})")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
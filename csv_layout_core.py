@@ -0,0 +1,2660 @@
+"""CSVレイアウト変換のコア処理
+
+GUI (CSVLayoutCustomization.py) とバッチ実行 (csv_layout_cli.py) の両方から
+利用される。tkinter / tkinterdnd2 には依存しない。
+"""
+import codecs
+import concurrent.futures
+import bz2
+import contextlib
+import csv
+import glob
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import zipfile
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+try:
+    # PyArrow は任意 (未導入の場合は pandas 標準の読み込み・書き出しを使う)
+    import pyarrow as pa
+    import pyarrow.compute as pa_compute
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    pa_compute = None
+    pa_csv = None
+
+# --- 定数定義 ---
+PROFILE_FILENAME = "csv_profiles.json"
+DEFAULT_PREF_CODE_COLUMN = "都道府県コード"
+EMPTY_COLUMN_PLACEHOLDER_PREFIX = "__EMPTY_COLUMN_"
+CONVERTED_SUFFIX = "_converted"
+# 分割読み込み (ストリーミング保存) 時の1チャンクあたりの行数
+DEFAULT_CHUNKSIZE = 100000
+# 文字コードの判定に使うファイル先頭のバイト数
+ENCODING_SAMPLE_BYTES = 64 * 1024
+# 読み込み・書き出しエンジン
+ENGINE_C = "c" # pandas 標準 (C パーサー)
+ENGINE_PYARROW = "pyarrow" # PyArrow (マルチスレッドの CSV リーダー / ライター, UTF-8 のみ)
+ENGINES = (ENGINE_C, ENGINE_PYARROW)
+# 読み込み済み入力のキャッシュが保持するデータの上限 (バイト)
+INPUT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# 行の位置の索引に記録する間隔 (行数) と、走査時に一度に読み込むバイト数
+ROW_INDEX_STEP = 1000
+ROW_INDEX_BLOCK_BYTES = 4 * 1024 * 1024
+# 変換結果のページ表示で一度に読み込み・変換する行数と、保持するページ数
+PREVIEW_PAGE_ROWS = 500
+PREVIEW_PAGE_CACHE = 4
+# メモリマップで読み込む場合に保持するファイル数 (プレビューしたファイルを保存時に再利用する)
+MEMORY_MAP_CACHE_SIZE = 1
+# 展開しながら読み込む圧縮形式 (拡張子 -> 開く関数)。ZIP は別に扱う
+COMPRESSED_INPUTS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+ZIP_EXTENSION = ".zip"
+# 圧縮・ZIP ファイルを展開しながら読み込む際の読み込み単位
+INPUT_BUFFER_BYTES = 1024 * 1024
+# 書き出し時にまとめて文字列化・エンコードする行数
+WRITE_BLOCK_ROWS = 50000
+# 圧縮して出力する場合の圧縮レベル (既定の gzip: 9 / xz: 6 は大きなファイルで時間がかかるため下げる)
+OUTPUT_GZIP_LEVEL = 6
+OUTPUT_XZ_PRESET = 3
+# 並列変換で1プロセスに渡す分割の大きさ (バイト) と、プロセスごとに同時に投入する分割数 (書き出し待ちを含む)
+PARALLEL_PARTITION_BYTES = 16 * 1024 * 1024
+PARALLEL_PENDING_PER_WORKER = 2
+# 互いに依存しない列の処理を並行して実行するスレッド数と、並行して実行する最小の行数 (少ない場合は順に実行する)
+COLUMN_THREADS = min(8, os.cpu_count() or 1)
+COLUMN_THREADS_MIN_ROWS = 50000
+
+# --- 都道府県名とコードのマッピング ---
+PREFECTURE_CODES = {
+    "北海道": "01", "青森県": "02", "岩手県": "03", "宮城県": "04", "秋田県": "05",
+    "山形県": "06", "福島県": "07", "茨城県": "08", "栃木県": "09", "群馬県": "10",
+    "埼玉県": "11", "千葉県": "12", "東京都": "13", "神奈川県": "14", "新潟県": "15",
+    "富山県": "16", "石川県": "17", "福井県": "18", "山梨県": "19", "長野県": "20",
+    "岐阜県": "21", "静岡県": "22", "愛知県": "23", "三重県": "24", "滋賀県": "25",
+    "京都府": "26", "大阪府": "27", "兵庫県": "28", "奈良県": "29", "和歌山県": "30",
+    "鳥取県": "31", "島根県": "32", "岡山県": "33", "広島県": "34", "山口県": "35",
+    "徳島県": "36", "香川県": "37", "愛媛県": "38", "高知県": "39", "福岡県": "40",
+    "佐賀県": "41", "長崎県": "42", "熊本県": "43", "大分県": "44", "宮崎県": "45",
+    "鹿児島県": "46", "沖縄県": "47"
+}
+PREFECTURES = list(PREFECTURE_CODES.keys())
+# 先頭一致の判定用: 文字数ごとの都道府県名 (3文字または4文字)
+# どの都道府県名も他の都道府県名の先頭部分にはならないため、一致する都道府県名は高々1つ
+_PREFECTURES_BY_LENGTH = {}
+for _pref in PREFECTURES:
+    _PREFECTURES_BY_LENGTH.setdefault(len(_pref), set()).add(_pref)
+del _pref
+
+
+class ConversionError(Exception):
+    """ファイル単位の変換を継続できないエラー"""
+
+
+class ConversionCancelled(Exception):
+    """ユーザー操作により変換が中止された"""
+
+
+class ProgressTracker:
+    """
+    読み込み/書き込み行数と処理中の段階を記録し、progress コールバックへ通知する。
+    cancel_event (threading.Event 等) がセットされていれば ConversionCancelled を送出する。
+    """
+
+    def __init__(self, progress=None, cancel_event=None):
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self.stage = ""
+        self.rows_read = 0
+        self.rows_written = 0
+
+    @property
+    def active(self) -> bool:
+        """通知先または中止の指定があるか (ない場合は分割せず一括で読み書きする)"""
+        return self.progress is not None or self.cancel_event is not None
+
+    def update(self, stage: str = None, rows_read: int = None, rows_written: int = None):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ConversionCancelled()
+        if stage is not None:
+            self.stage = stage
+        if rows_read is not None:
+            self.rows_read = rows_read
+        if rows_written is not None:
+            self.rows_written = rows_written
+        if self.progress is not None:
+            self.progress(self.stage, self.rows_read, self.rows_written)
+
+
+
+def process_memory():
+    """現在のプロセスの物理メモリ使用量 (バイト)。取得できない環境では None"""
+    if sys.platform == "win32":
+        return _windows_working_set()
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _windows_working_set():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    try:
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters),
+                                                        counters.cb):
+            return None
+        return counters.WorkingSetSize
+    except (OSError, AttributeError):
+        return None
+
+
+class StageMetrics:
+    """
+    読み込み・各段階・書き込みの処理時間、入出力の行数・列数、メモリ使用量の増減を段階ごとに記録する。
+    分割読み込みでは同じ段階の計測がチャンクごとに加算される。
+    """
+
+    def __init__(self):
+        self._records = {} # 段階名 -> 記録 (最初に計測した順)
+
+    def start(self) -> tuple:
+        """計測を開始する (戻り値を add に渡す)"""
+        return time.perf_counter(), process_memory()
+
+    def add(self, stage: str, started: tuple, rows_in: int = None, rows_out: int = None,
+            columns_in: int = None, columns_out: int = None):
+        seconds = time.perf_counter() - started[0]
+        memory = process_memory()
+        record = self._record(stage)
+        record["reused"] = False
+        record["seconds"] += seconds
+        record["calls"] += 1
+        for key, rows in (("rows_in", rows_in), ("rows_out", rows_out)):
+            if rows is not None:
+                record[key] = (record[key] or 0) + rows
+        if columns_in is not None:
+            record["columns_in"] = columns_in
+        if columns_out is not None:
+            record["columns_out"] = columns_out
+        if memory is not None and started[1] is not None:
+            record["memory_delta_bytes"] = (record["memory_delta_bytes"] or 0) + memory - started[1]
+
+    def add_reused(self, stage: str):
+        """前回の出力を再利用して実行しなかった段階を記録する"""
+        record = self._record(stage)
+        record["reused"] = record["calls"] == 0
+
+    def _record(self, stage: str) -> dict:
+        if stage not in self._records:
+            self._records[stage] = {
+                "stage": stage, "seconds": 0.0, "rows_in": None, "rows_out": None, "columns_in": None,
+                "columns_out": None, "memory_delta_bytes": None, "calls": 0, "reused": False,
+            }
+        return self._records[stage]
+
+    def merge(self, records: list):
+        """別プロセスで計測した記録 (to_list の結果) を段階ごとに加算する"""
+        for other in records:
+            record = self._record(other["stage"])
+            record["reused"] = False
+            record["seconds"] += other["seconds"]
+            record["calls"] += other["calls"]
+            for key in ("rows_in", "rows_out", "memory_delta_bytes"):
+                if other[key] is not None:
+                    record[key] = (record[key] or 0) + other[key]
+            for key in ("columns_in", "columns_out"):
+                if other[key] is not None:
+                    record[key] = other[key]
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(record["seconds"] for record in self._records.values())
+
+    def to_list(self) -> list:
+        """記録を辞書のリストで返す (JSON に変換できる形式)"""
+        return [dict(record, seconds=round(record["seconds"], 6)) for record in self._records.values()]
+
+
+def default_profile() -> dict:
+    """新規プロファイルの初期設定を返す"""
+    return {
+        "reorder": "",
+        "merge": "",
+        "extract": "",
+        "remove": "",
+        "add": "",
+        "replace": "",
+        "remove_prefecture": {"enabled": False, "column": ""},
+        "get_pref_code": {"enabled": False, "source_column": "", "new_column": DEFAULT_PREF_CODE_COLUMN},
+        "remove_header": False
+    }
+
+
+def load_profiles(profile_path: str = PROFILE_FILENAME) -> dict:
+    """プロファイルファイルを読み込む。存在しない場合は空の辞書を返す"""
+    if not os.path.exists(profile_path):
+        return {}
+    with open(profile_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def input_compression(file_path: str):
+    """入力ファイルの圧縮形式の拡張子 (".gz" / ".bz2" / ".xz" / ".zip") を返す。圧縮されていない場合は None"""
+    extension = os.path.splitext(file_path)[1].lower()
+    return extension if extension in COMPRESSED_INPUTS or extension == ZIP_EXTENSION else None
+
+
+def is_csv_input(file_path: str) -> bool:
+    """変換できる入力ファイル (*.csv, その圧縮ファイル *.csv.gz 等, *.zip) か"""
+    compression = input_compression(file_path)
+    if compression == ZIP_EXTENSION:
+        return True
+    name = file_path[:-len(compression)] if compression else file_path
+    return name.lower().endswith(".csv")
+
+
+def open_input(file_path: str):
+    """
+    入力ファイルをバイナリモードで開く。圧縮ファイルは展開しながら読み込むストリームを返す
+    (ファイルに展開しない。seek は展開し直して移動するため、後方への移動は先頭から読み直しになる)。
+    ZIP ファイルは含まれる CSV をファイル名順に連結して1つの CSV として読み込む (2件目以降のヘッダー行は除く)。
+    """
+    compression = input_compression(file_path)
+    if compression == ZIP_EXTENSION:
+        archive = zipfile.ZipFile(file_path)
+        try:
+            return io.BufferedReader(_ZipMembersStream(archive, _zip_csv_members(archive, file_path)),
+                                     INPUT_BUFFER_BYTES)
+        except BaseException:
+            archive.close()
+            raise
+    if compression:
+        return COMPRESSED_INPUTS[compression](file_path, "rb")
+    return open(file_path, "rb")
+
+
+@contextlib.contextmanager
+def _csv_source(file_path: str):
+    """pandas / PyArrow に渡す入力 (圧縮されていないファイルはパスのまま、それ以外は展開しながら読み込むストリーム)"""
+    if input_compression(file_path) is None:
+        yield file_path
+    else:
+        with open_input(file_path) as f:
+            yield f
+
+
+def _zip_csv_members(archive: zipfile.ZipFile, file_path: str) -> list:
+    """ZIP 内の CSV ファイル名をファイル名順に返す (フォルダや macOS の付加情報は除く)"""
+    names = sorted(
+        info.filename for info in archive.infolist()
+        if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith("._") and is_csv_input(info.filename)
+        and input_compression(info.filename) is None
+    )
+    if not names:
+        raise ConversionError(f"ZIPファイルにCSVファイルが含まれていません: {file_path}")
+    return names
+
+
+class _ZipMembersStream(io.RawIOBase):
+    """ZIP 内の複数の CSV を1つの CSV として順に読み込む (2件目以降のヘッダー行は先頭のものと一致する必要がある)"""
+
+    def __init__(self, archive: zipfile.ZipFile, names: list):
+        self._archive = archive
+        self._names = names
+        self._rewind()
+
+    def _rewind(self):
+        if getattr(self, "_member", None) is not None:
+            self._member.close()
+        self._index = -1
+        self._member = None
+        self._header = None # 先頭のファイルのヘッダー行 (BOM・改行を除く)
+        self._pending = b"" # ファイル本体より先に返すバイト列
+        self._last_byte = b""
+        self._position = 0
+        self._open_next()
+
+    def _open_next(self) -> bool:
+        if self._member is not None:
+            self._member.close()
+            self._member = None
+        while self._index + 1 < len(self._names):
+            self._index += 1
+            member = self._archive.open(self._names[self._index])
+            header_line = member.readline()
+            header = header_line.removeprefix(codecs.BOM_UTF8).rstrip(b"\r\n")
+            if not header.strip():
+                member.close()
+                continue # 空のファイル
+            if self._header is None:
+                self._header = header
+                self._pending = header_line
+            elif header != self._header:
+                member.close()
+                raise ConversionError(
+                    f"ZIPファイル内の {self._names[self._index]} の項目名が {self._names[0]} と異なります。")
+            elif self._last_byte not in (b"\n", b""):
+                # 前のファイルの最終行に改行がない場合は、行が連結されないよう改行を補う
+                self._pending = b"\n"
+            self._member = member
+            return True
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while True:
+            if self._pending:
+                data, self._pending = self._pending[:len(buffer)], self._pending[len(buffer):]
+            elif self._member is None:
+                return 0
+            else:
+                data = self._member.read(len(buffer))
+                if not data:
+                    if not self._open_next():
+                        return 0
+                    continue
+            buffer[:len(data)] = data
+            self._last_byte = data[-1:]
+            self._position += len(data)
+            return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("ZIPファイルの末尾からの移動はできません")
+        if offset < self._position:
+            self._rewind()
+        buffer = bytearray(min(max(offset - self._position, 0), INPUT_BUFFER_BYTES))
+        while self._position < offset:
+            if not self.readinto(memoryview(buffer)[:offset - self._position]):
+                break
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            if self._member is not None:
+                self._member.close()
+            self._archive.close()
+        super().close()
+
+
+def detect_encoding(file_path: str, sample_size: int = ENCODING_SAMPLE_BYTES):
+    """
+    ファイル先頭の sample_size バイトから文字コードを判定する。
+    "utf-8-sig" (BOM付き) / "utf-8" / "shift_jis" / "cp932" (NEC・IBM拡張文字を含むShift-JIS) のいずれかを返す。
+    ASCII文字のみで判定できない場合は None を返す。
+    """
+    with open_input(file_path) as f:
+        sample = f.read(sample_size)
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.isascii():
+        return None
+    # ファイルの途中までしか読んでいない場合、末尾で途切れた文字は誤りとしない
+    final = len(sample) < sample_size
+    # shift_jis で読める場合は shift_jis を優先する (cp932 とは一部の記号の変換先が異なるため)
+    for encoding in ("utf-8", "shift_jis", "cp932"):
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=final)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return None
+
+
+def encoding_family(encoding: str) -> str:
+    """文字コードを画面で選択できる "utf-8" / "shift_jis" のどちらかにまとめる"""
+    return "utf-8" if codecs.lookup(encoding).name in ("utf-8", "utf-8-sig") else "shift_jis"
+
+
+def candidate_encodings(file_path: str, encoding: str) -> list:
+    """
+    読み込みを試す文字コードを順に返す。
+    ファイル先頭の判定結果 (判定できない場合は指定の文字コード) を最初に、読み込めなかった場合の代替を続ける。
+    """
+    first = detect_encoding(file_path) or encoding
+    if encoding_family(first) == "utf-8":
+        fallbacks = ["shift_jis", "cp932"]
+    else:
+        # 判定に使った範囲より後ろに cp932 の拡張文字がある場合も読めるようにする
+        fallbacks = ["cp932", "utf-8"]
+    return list(dict.fromkeys([first] + fallbacks))
+
+
+def read_with_encodings(encodings: list, read):
+    """encodings の順に read(文字コード) を試し、(結果, 使用した文字コード) を返す"""
+    for encoding in encodings[:-1]:
+        try:
+            return read(encoding), encoding
+        except UnicodeDecodeError:
+            pass
+    return read(encodings[-1]), encodings[-1]
+
+
+def output_encoding_for(input_encoding: str, output_encoding: str) -> str:
+    """Shift-JIS で出力する場合、入力が cp932 (Windowsの拡張文字を含む) なら cp932 で書き出す"""
+    if codecs.lookup(output_encoding).name == "shift_jis" and codecs.lookup(input_encoding).name == "cp932":
+        return "cp932"
+    return output_encoding
+
+
+def read_csv(file_path: str, encoding: str, nrows: int = None, columns=None) -> pd.DataFrame:
+    """
+    CSVをすべて文字列として読み込む。nrows を指定した場合は先頭の nrows 行のみ読み込む。
+    columns (項目名の集合) を指定した場合はその項目のみ読み込む
+    (項目数がヘッダーより多い行は、全項目を読み込む場合と同じく pd.errors.ParserError にする)。
+    """
+    # keep_default_na=False で空文字列を NaN にしない
+    # dtype=str ですべての列を文字列として読み込む
+    usecols = None
+    if columns is not None:
+        first = _read_first_row(file_path, encoding)
+        usecols = _usecols(first, columns)
+        if usecols is not None:
+            # usecols を指定すると pandas は項目数を確認しないため、全項目を読み込む場合と同じく先に確認する
+            check_field_counts(file_path, encoding, first)
+    with _csv_source(file_path) as source:
+        return pd.read_csv(source, encoding=encoding, dtype=str, keep_default_na=False, nrows=nrows, usecols=usecols)
+
+
+@contextlib.contextmanager
+def read_csv_chunks(file_path: str, encoding: str, chunksize: int = DEFAULT_CHUNKSIZE, columns=None,
+                    tracker: ProgressTracker = None):
+    """
+    CSVを chunksize 行ずつ読み込むリーダーを返す (with 文で使用する)。
+    項目数がヘッダーより多い行がある場合は、読み込む前に pd.errors.ParserError を送出する
+    (tracker を指定した場合は、この確認の間も中止の指定を確認する)。
+    """
+    first = _read_first_row(file_path, encoding)
+    # pandas は2つ目以降のチャンクの先頭行の項目数を確認しないため、先にファイル全体を確認する
+    if tracker is not None:
+        tracker.update("項目数の確認", rows_read=0)
+    check_field_counts(file_path, encoding, first, tracker)
+    # 行ラベルの有無は先頭のデータ行で決め、以降のチャンクで余分な項目を行ラベルにしない
+    options = {} if _has_row_labels(first) else {"index_col": False}
+    with _csv_source(file_path) as source, pd.read_csv(
+            source, encoding=encoding, dtype=str, keep_default_na=False, chunksize=chunksize,
+            usecols=_usecols(first, columns), **options) as reader:
+        yield reader
+
+
+def _read_header(file_path: str, encoding: str) -> list:
+    """ヘッダー行の項目名を返す (重複した項目名は pandas と同じく "項目.1" 等に変わる)"""
+    with _csv_source(file_path) as source:
+        return list(pd.read_csv(source, encoding=encoding, dtype=str, nrows=0).columns)
+
+
+def _column_positions(header: list, columns):
+    """ヘッダーのうち columns に含まれる項目の列番号を返す (None は全項目)"""
+    # 必要な項目がファイルに1つもない場合は、行数を保つためすべての項目を読み込む
+    return [i for i, name in enumerate(header) if name in columns] or None
+
+
+def _selected_columns(header: list, columns) -> list:
+    """ヘッダーのうち読み込む項目名を返す (columns が None の場合は全項目)"""
+    positions = None if columns is None else _column_positions(header, columns)
+    return header if positions is None else [header[i] for i in positions]
+
+
+def _read_first_row(file_path: str, encoding: str) -> pd.DataFrame:
+    """ヘッダー行と先頭のデータ行を読み込む"""
+    with _csv_source(file_path) as source:
+        return pd.read_csv(source, encoding=encoding, dtype=str, nrows=1)
+
+
+def _has_row_labels(first: pd.DataFrame) -> bool:
+    """
+    先頭のデータ行の項目数がヘッダーより多いか。
+    この場合 pandas は余分な先頭の列を行ラベルにして読み込むため、列番号で選ぶと項目の対応が変わる。
+    """
+    return not isinstance(first.index, pd.RangeIndex)
+
+
+def _usecols(first: pd.DataFrame, columns):
+    """読み込む項目名の集合を read_csv の usecols (列番号のリスト) に変換する (None は全項目)"""
+    if columns is None or _has_row_labels(first):
+        return None # 行ラベルがある場合は全項目を読み込む (項目を絞らない場合と同じ内容にする)
+    # 重複した項目名も区別できるよう、ヘッダー行から列番号を求める
+    return _column_positions(list(first.columns), columns)
+
+
+def _field_limit(first: pd.DataFrame) -> int:
+    """
+    読み込める行の項目数の上限 (ヘッダーの項目数。先頭のデータ行の方が多い場合はその項目数)。
+    pandas はこれより項目数の多い行を解析エラーにする。
+    """
+    return len(first.columns) + (first.index.nlevels if _has_row_labels(first) else 0)
+
+
+class _FieldCountChecker:
+    """
+    CSV のバイト列を先頭から順に受け取り、項目数が limit より多い行があれば pd.errors.ParserError を送出する。
+    引用符 (") の外の "," と改行 (CR LF / LF / CR) の位置から行ごとの項目数を数える。
+    0x22 (") / 0x2C (,) / 0x0A / 0x0D は Shift-JIS / cp932 の2バイト目にも UTF-8 のマルチバイト文字にも現れないため、
+    文字コードによらずバイト単位で判定できる。
+    値の途中に引用符がある等、引用符の位置だけでは値の範囲を決められない場合は regular が False になり、以降は判定しない。
+    """
+
+    # 値を囲む引用符の前後に置ける文字 (区切り・改行・引用符のエスケープ)
+    _QUOTE_NEIGHBORS = np.array([0x2C, 0x0A, 0x0D, 0x22], dtype=np.uint8)
+
+    def __init__(self, limit: int, numbered: bool = True):
+        self.limit = limit
+        self.regular = True
+        # 現在の行の行番号 (ヘッダー行が 1 行目、空行も数える。ファイルの途中から確認する場合は None)
+        self._line = 1 if numbered else None
+        self._commas = 0 # 現在の行で見つけた区切りの数
+        self._in_quotes = False
+        self._previous = 0x0A # 直前のバイト (先頭は行頭として扱う)
+        self._closed_at_end = False # 直前のブロックが閉じる引用符で終わったか
+        self._started = False
+
+    def feed(self, block: bytes):
+        if not self._started:
+            self._started = True
+            if block.startswith(codecs.BOM_UTF8):
+                block = block[len(codecs.BOM_UTF8):]
+        if not self.regular or not block:
+            return
+        data = np.frombuffer(block, dtype=np.uint8)
+        if self._closed_at_end and data[0] not in self._QUOTE_NEIGHBORS:
+            self.regular = False
+            return
+        quotes = np.flatnonzero(data == 0x22)
+        if len(quotes):
+            # 開く引用符は値の先頭、閉じる引用符は値の末尾にのみ置ける
+            opening = (np.arange(len(quotes)) + self._in_quotes) % 2 == 0
+            before = np.where(quotes > 0, data[quotes - 1], self._previous)
+            after = np.append(data, 0x2C)[quotes + 1] # ブロックの末尾の後ろは次のブロックで確認する
+            if not (np.isin(before[opening], self._QUOTE_NEIGHBORS).all()
+                    and np.isin(after[~opening], self._QUOTE_NEIGHBORS).all()):
+                self.regular = False
+                return
+            self._closed_at_end = bool(quotes[-1] == len(data) - 1 and not opening[-1])
+        else:
+            self._closed_at_end = False
+
+        carriage_returns = data == 0x0D
+        # CR LF の LF は CR で行が終わっているため数えない
+        follows_cr = np.concatenate(([self._previous == 0x0D], carriage_returns[:-1]))
+        line_ends = carriage_returns | ((data == 0x0A) & ~follows_cr)
+        events = np.flatnonzero(line_ends | (data == 0x2C))
+        if len(quotes) or self._in_quotes:
+            # 前にある引用符の数が奇数 (引用符の中) の区切り・改行は値の一部
+            quoted = (np.searchsorted(quotes, events) + self._in_quotes) % 2 == 1
+            events = events[~quoted]
+            self._in_quotes = (len(quotes) + self._in_quotes) % 2 == 1
+        self._previous = int(data[-1])
+
+        ends = np.flatnonzero(line_ends[events]) # events のうち改行の位置
+        commas = len(events) - len(ends)
+        if not len(ends):
+            self._commas += commas
+            return
+        # 各改行より前の区切りの数から、行ごとの区切りの数を求める
+        commas_before = ends - np.arange(len(ends))
+        fields = np.diff(commas_before, prepend=0) + 1
+        fields[0] += self._commas
+        self._check(fields)
+        if self._line is not None:
+            self._line += len(ends)
+        self._commas = commas - int(commas_before[-1])
+
+    def finish(self):
+        """末尾に改行のない最後の行を確認する"""
+        if self.regular:
+            self._check(np.array([self._commas + 1]))
+
+    def _check(self, fields: np.ndarray):
+        over = np.flatnonzero(fields > self.limit)
+        if len(over):
+            line = None if self._line is None else self._line + int(over[0])
+            raise _too_many_fields(line, int(fields[over[0]]), self.limit)
+
+
+def _too_many_fields(line, fields: int, limit: int) -> pd.errors.ParserError:
+    where = "項目数がヘッダーより多い行があります" if line is None else f"{line} 行目の項目数がヘッダーより多くなっています"
+    return pd.errors.ParserError(f"{where} (項目数 {fields}, ヘッダー {limit})")
+
+
+def _check_field_counts_text(stream, encoding: str, limit: int, tracker: ProgressTracker = None,
+                             numbered: bool = True):
+    """
+    _FieldCountChecker で判定できない CSV を、文字列に変換して1行ずつ確認する。
+    値の途中の引用符は pandas と同様に値の一部として扱う。
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig" if is_utf8(encoding) else encoding, newline="")
+    for line, row in enumerate(csv.reader(text), 1):
+        if len(row) > limit:
+            raise _too_many_fields(line if numbered else None, len(row), limit)
+        if tracker is not None and line % DEFAULT_CHUNKSIZE == 0:
+            tracker.update()
+    text.detach()
+
+
+def check_field_counts(file_path: str, encoding: str, first: pd.DataFrame = None, tracker: ProgressTracker = None,
+                       block_size: int = ROW_INDEX_BLOCK_BYTES):
+    """
+    項目数がヘッダー (先頭のデータ行の方が多い場合はその行) より多い行があれば pd.errors.ParserError を送出する。
+    pandas は項目を絞った読み込み (usecols) と分割した読み込み (chunksize の各チャンクの先頭行) ではこの確認を省くため、
+    読み込み方によらず、ファイル全体を読み込んだ場合と同じファイルを不正とするために使う。
+    first には _read_first_row の結果を渡せる (省略時は読み込む)。
+    """
+    if first is None:
+        first = _read_first_row(file_path, encoding)
+    limit = _field_limit(first)
+    checker = _FieldCountChecker(limit)
+    with open_input(file_path) as f:
+        while checker.regular:
+            block = f.read(block_size)
+            if not block:
+                checker.finish()
+                return
+            checker.feed(block)
+            if tracker is not None:
+                tracker.update()
+    with open_input(file_path) as f:
+        _check_field_counts_text(f, encoding, limit, tracker)
+
+
+def _check_partition_field_counts(data: bytes, encoding: str, limit: int):
+    """分割したファイルの一部 (data) に項目数が limit より多い行があれば pd.errors.ParserError を送出する"""
+    checker = _FieldCountChecker(limit, numbered=False)
+    checker.feed(data)
+    checker.finish()
+    if not checker.regular:
+        _check_field_counts_text(io.BytesIO(data), encoding, limit, numbered=False)
+
+
+def pyarrow_available() -> bool:
+    return pa is not None
+
+
+def is_utf8(encoding: str) -> bool:
+    return codecs.lookup(encoding).name == "utf-8"
+
+
+def read_csv_arrow(file_path: str, columns=None, encoding: str = "utf-8") -> pd.DataFrame:
+    """
+    PyArrow のマルチスレッド CSV リーダーで UTF-8 の CSV をすべて文字列として読み込む。
+    各列は Arrow の文字列配列のまま保持する (Python の文字列オブジェクトに変換しない)。
+    Arrow で解釈できないファイル (列数が揃わない行がある等) では pa.ArrowInvalid を送出する。
+    """
+    # 項目名は pandas と同じ規則で求め (重複した項目名の扱いを揃える)、ヘッダー行は読み飛ばす
+    header = _read_header(file_path, encoding)
+    selected = _selected_columns(header, columns)
+    with _csv_source(file_path) as source:
+        table = pa_csv.read_csv(source, **_arrow_csv_options(header, selected))
+    return _arrow_to_pandas(table)
+
+
+def _arrow_csv_options(header: list, selected: list, encoding: str = "utf-8") -> dict:
+    """PyArrow の CSV リーダーの設定 (すべての項目を文字列として読み込む)"""
+    return {
+        # UTF-8 (BOM 付きを含む) 以外は PyArrow がブロックごとに文字コードを変換する
+        "read_options": pa_csv.ReadOptions(
+            column_names=header, skip_rows=1, use_threads=True,
+            encoding="utf8" if encoding_family(encoding) == "utf-8" else encoding),
+        "parse_options": pa_csv.ParseOptions(newlines_in_values=True),
+        "convert_options": pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in header},
+            include_columns=selected,
+            # 空文字列を欠損値にしない (keep_default_na=False と同じ)
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+    }
+
+
+def _arrow_to_pandas(table) -> pd.DataFrame:
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+
+def memory_map_available(file_path: str) -> bool:
+    """メモリマップで読み込めるか (PyArrow が導入済みで、圧縮されていないファイル)"""
+    return pyarrow_available() and input_compression(file_path) is None
+
+
+_mapped_inputs = {} # (パス, サイズ, 更新日時) -> pa.Buffer (挿入順 = 使用順)
+_mapped_inputs_lock = threading.Lock()
+
+
+def _mapped_input(file_path: str):
+    """
+    ファイル全体をメモリマップした pa.Buffer を返す (コピーしない)。
+    同じファイル (サイズ・更新日時が同じ) は前回のマップを再利用し、プレビューと保存で共有する。
+    """
+    key = _file_key(file_path)
+    with _mapped_inputs_lock:
+        buffer = _mapped_inputs.pop(key, None)
+        if buffer is None:
+            with pa.memory_map(file_path) as mapped:
+                buffer = mapped.read_buffer()
+        _mapped_inputs[key] = buffer # 最近使用したものとして末尾へ
+        while len(_mapped_inputs) > MEMORY_MAP_CACHE_SIZE:
+            _mapped_inputs.pop(next(iter(_mapped_inputs))) # 読み込み中のものは参照がなくなった時点で解放される
+    return buffer
+
+
+def release_mapped_inputs():
+    """保持しているメモリマップを解放する (Windows ではマップ中のファイルを他のアプリから上書きできないため)"""
+    with _mapped_inputs_lock:
+        _mapped_inputs.clear()
+
+
+@contextlib.contextmanager
+def _open_csv_mapped(file_path: str, encoding: str, columns=None):
+    """メモリマップしたファイルを直接解析する PyArrow のストリーミングリーダーを返す (with 文で使用する)"""
+    header = _read_header(file_path, encoding)
+    selected = _selected_columns(header, columns)
+    reader = pa_csv.open_csv(pa.BufferReader(_mapped_input(file_path)), **_arrow_csv_options(header, selected, encoding))
+    try:
+        yield reader
+    finally:
+        reader.close()
+
+
+def read_csv_mapped(file_path: str, encoding: str, nrows: int = None, columns=None,
+                    tracker: ProgressTracker = None) -> pd.DataFrame:
+    """
+    メモリマップしたファイルを PyArrow で直接解析し、すべて文字列として読み込む (read_csv と同じ内容)。
+    文字コードの変換はブロックごとに行い、変換後の文字列全体を保持しない。
+    nrows を指定した場合は先頭の nrows 行を読み込んだ時点で解析を終える。
+    Arrow で解釈できない場合は pa.ArrowInvalid を、文字コードが誤っている場合は UnicodeDecodeError を送出する。
+    """
+    with _open_csv_mapped(file_path, encoding, columns) as reader:
+        batches = []
+        rows = 0
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            if tracker is not None:
+                tracker.update(rows_read=rows)
+            if nrows is not None and rows >= nrows:
+                break
+        table = pa.Table.from_batches(batches, schema=reader.schema)
+    return _arrow_to_pandas(table if nrows is None else table.slice(0, nrows))
+
+
+@contextlib.contextmanager
+def read_csv_mapped_chunks(file_path: str, encoding: str, chunksize: int = DEFAULT_CHUNKSIZE, columns=None):
+    """read_csv_mapped を chunksize 行ずつ読み込むイテレーターを返す (with 文で使用する。行番号は通しで振る)"""
+    with _open_csv_mapped(file_path, encoding, columns) as reader:
+        yield _rebatch(reader, chunksize)
+
+
+def _rebatch(reader, chunksize: int):
+    batches = []
+    rows = 0
+    start = 0
+    for batch in reader:
+        batches.append(batch)
+        rows += batch.num_rows
+        while rows >= chunksize:
+            table = pa.Table.from_batches(batches, schema=reader.schema)
+            chunk = _arrow_to_pandas(table.slice(0, chunksize))
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+            rest = table.slice(chunksize)
+            batches = rest.to_batches()
+            rows = rest.num_rows
+    if rows:
+        chunk = _arrow_to_pandas(pa.Table.from_batches(batches, schema=reader.schema))
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        yield chunk
+
+
+def read_csv_with_fallback(file_path: str, encoding: str, tracker: ProgressTracker = None,
+                           columns=None, engine: str = ENGINE_C, memory_map: bool = False) -> (pd.DataFrame, str, str):
+    """
+    ファイル先頭から判定した文字コード (判定できない場合は指定の文字コード) で読み込み、
+    失敗した場合は代替の文字コードを試行する。
+    (DataFrame, 実際に使用したエンコーディング, 実際に使用したエンジン) を返す。
+    tracker を指定した場合は分割して読み込み、読み込み行数の通知と中止の確認を行う。
+    engine に ENGINE_PYARROW を指定しても、PyArrow が未導入の場合・UTF-8 以外の場合・
+    Arrow で読み込めない場合は pandas 標準の読み込みに切り替える。
+    memory_map を指定した場合はメモリマップしたファイルを PyArrow で直接解析する (文字コードによらない。
+    使用できない場合・Arrow で解釈できない場合は同様に切り替える)。
+    """
+    encodings = candidate_encodings(file_path, encoding)
+    if memory_map and memory_map_available(file_path):
+        if tracker is not None:
+            tracker.update("読み込み", rows_read=0)
+        try:
+            df, used_encoding = read_with_encodings(
+                encodings, lambda candidate: read_csv_mapped(file_path, candidate, columns=columns, tracker=tracker))
+        except (pa.ArrowException, UnicodeDecodeError):
+            pass # UTF-8 として不正な場合 (Arrow では ArrowInvalid) を含め、従来の読み込みで判定する
+        else:
+            return df, used_encoding, ENGINE_PYARROW if engine == ENGINE_PYARROW else ENGINE_C
+    if engine == ENGINE_PYARROW and pyarrow_available() and encoding_family(encodings[0]) == "utf-8":
+        if tracker is not None:
+            tracker.update("読み込み", rows_read=0)
+        try:
+            df = read_csv_arrow(file_path, columns, encodings[0])
+        except (pa.ArrowException, UnicodeDecodeError):
+            pass # 文字コードの誤り (UTF-8 として不正) を含め、従来の読み込みで判定する
+        else:
+            if tracker is not None:
+                tracker.update(rows_read=len(df))
+            return df, encodings[0], ENGINE_PYARROW
+    df, used_encoding = read_with_encodings(
+        encodings, lambda candidate: _read_csv_tracked(file_path, candidate, tracker, columns))
+    return df, used_encoding, ENGINE_C
+
+
+def _read_csv_tracked(file_path: str, encoding: str, tracker: ProgressTracker = None, columns=None) -> pd.DataFrame:
+    if tracker is None or not tracker.active:
+        return read_csv(file_path, encoding, columns=columns)
+
+    chunks = []
+    rows_read = 0
+    # read_csv と同じく、項目数がヘッダーより多い行があるファイルは読み込まない
+    with read_csv_chunks(file_path, encoding, columns=columns, tracker=tracker) as reader:
+        tracker.update("読み込み", rows_read=0)
+        for chunk in reader:
+            chunks.append(chunk)
+            rows_read += len(chunk)
+            tracker.update(rows_read=rows_read)
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+
+
+@dataclass(frozen=True)
+class _CachedInput:
+    df: pd.DataFrame
+    encoding: str # 実際に使用した文字コード
+    complete: bool # ファイル末尾まで読み込み済みか
+    size: int # 推定メモリ使用量 (バイト)
+
+
+class ParsedInputCache:
+    """
+    読み込み済みの入力 (DataFrame) を (パス, サイズ, 更新日時, 文字コード) をキーに保持する LRU キャッシュ。
+    同じファイルに別のプロファイルを適用する場合は読み込みを省略し、変換のみやり直す。
+    保持するデータの合計が max_bytes を超えると、最も長く使われていないものから破棄する。
+    返した DataFrame は共有されるため、変更しないこと (変換処理は元の DataFrame を変更しない)。
+    """
+
+    def __init__(self, max_bytes: int = INPUT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = {} # 挿入順 = 使用順 (先頭が最も古い)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def read(self, file_path: str, encoding: str, nrows: int = None, memory_map: bool = False) -> tuple:
+        """
+        先頭の nrows 行 (None の場合は全行) を (DataFrame, 使用した文字コード) で返す。
+        キャッシュにないか行数が足りない場合は読み込み、結果をキャッシュする。
+        memory_map を指定した場合はメモリマップしたファイルから読み込む (保存時にも同じマップを使う)。
+        """
+        stat = os.stat(file_path)
+        # ファイルが更新された場合はサイズか更新日時が変わり、別のキーになる
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, encoding)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry # 最近使用したものとして末尾へ移動
+        if entry is not None and (entry.complete or (nrows is not None and len(entry.df) >= nrows)):
+            df = entry.df if nrows is None or len(entry.df) <= nrows else entry.df.head(nrows)
+            return df, entry.encoding
+
+        encodings = candidate_encodings(file_path, encoding)
+        df = None
+        if memory_map and memory_map_available(file_path):
+            try:
+                df, used_encoding = read_with_encodings(
+                    encodings, lambda candidate: read_csv_mapped(file_path, candidate, nrows=nrows))
+            except (pa.ArrowException, UnicodeDecodeError):
+                pass # 従来の読み込みで判定する
+        if df is None:
+            df, used_encoding = read_with_encodings(
+                encodings, lambda candidate: read_csv(file_path, candidate, nrows=nrows))
+        self._store(key, _CachedInput(df=df, encoding=used_encoding, complete=nrows is None or len(df) < nrows,
+                                      size=int(df.memory_usage(index=True, deep=True).sum())))
+        return df, used_encoding
+
+    def _store(self, key: tuple, entry: _CachedInput):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old.size
+            if entry.size > self.max_bytes:
+                return # 上限を超える大きさのものは保持しない
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+            while self._total_bytes > self.max_bytes:
+                evicted = self._entries.pop(next(iter(self._entries)))
+                self._total_bytes -= evicted.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+
+@dataclass(frozen=True)
+class RowIndex:
+    """データ行 (ヘッダーの次の行が 0 行目) の step 行ごとの開始位置 (バイト) と行数"""
+    source: tuple # (パス, サイズ, 更新日時)
+    offsets: np.ndarray # offsets[k] は k * step 行目の開始位置
+    row_count: int
+    step: int
+
+    def matches(self, file_path: str) -> bool:
+        """索引の作成後にファイルが変更されていないか"""
+        return self.source == _file_key(file_path)
+
+
+def _file_key(file_path: str) -> tuple:
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+def build_row_index(file_path: str, step: int = ROW_INDEX_STEP, tracker: ProgressTracker = None,
+                    block_size: int = ROW_INDEX_BLOCK_BYTES) -> RowIndex:
+    """
+    ファイルをバイト列のまま先頭から走査し、step 行ごとのデータ行の開始位置を記録する。
+    引用符 (") で囲まれた値の中の改行は行の区切りとせず、空白のみの行は pandas と同様に数えない。
+    0x22 (") と 0x0A (改行) は Shift-JIS / cp932 の2バイト目にも UTF-8 のマルチバイト文字にも現れないため、
+    文字コードによらずバイト単位で判定できる (値の途中に単独の引用符がある不正な CSV では位置がずれる)。
+    """
+    source = _file_key(file_path)
+    offsets = []
+    records = 0 # 見つけた行数 (空行を除く, ヘッダーを含む)
+    in_quotes = False
+    record_start = 0 # 区切りを見つけていない行の開始位置
+    record_has_text = False # その行に空白以外の文字があるか
+    position = 0
+    if tracker is not None:
+        tracker.update("行の位置を確認", rows_read=0)
+    with open_input(file_path) as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            data = np.frombuffer(block, dtype=np.uint8)
+            newlines = np.flatnonzero(data == 0x0A)
+            quotes = np.flatnonzero(data == 0x22)
+            if len(quotes) or in_quotes:
+                # 改行より前の引用符の数が偶数 (引用符の外) の改行のみ行の区切りとする
+                quoted = (np.searchsorted(quotes, newlines) + in_quotes) % 2 == 1
+                newlines = newlines[~quoted]
+                in_quotes = (len(quotes) + in_quotes) % 2 == 1
+            # 空白・タブ・CR 以外の文字の累積数で、各行に文字があるかを判定する
+            text_count = np.concatenate(([0], np.cumsum((data != 0x20) & (data != 0x09) & (data != 0x0D))))
+            if len(newlines):
+                starts = np.concatenate(([0], newlines[:-1] + 1))
+                has_text = text_count[newlines] - text_count[starts] > 0
+                has_text[0] |= record_has_text
+                record_starts = np.concatenate(([record_start], position + newlines[:-1] + 1))[has_text]
+                # ヘッダーを 0 行目として数えた行番号 - 1 がデータ行の番号
+                row_numbers = records + np.arange(len(record_starts)) - 1
+                offsets.append(record_starts[(row_numbers >= 0) & (row_numbers % step == 0)])
+                records += len(record_starts)
+                record_start = position + int(newlines[-1]) + 1
+                record_has_text = bool(text_count[-1] - text_count[newlines[-1] + 1] > 0)
+            else:
+                record_has_text = record_has_text or bool(text_count[-1] > 0)
+            position += len(block)
+            if tracker is not None:
+                tracker.update(rows_read=max(0, records - 1))
+
+    if record_has_text:
+        # 末尾に改行のない最後の行
+        if records >= 1 and (records - 1) % step == 0:
+            offsets.append(np.array([record_start]))
+        records += 1
+    offsets = np.concatenate(offsets).astype(np.int64) if offsets else np.zeros(0, dtype=np.int64)
+    return RowIndex(source=source, offsets=offsets, row_count=max(0, records - 1), step=step)
+
+
+def read_csv_rows(file_path: str, encoding: str, row_index: RowIndex, start: int, nrows: int,
+                  names: list) -> pd.DataFrame:
+    """
+    データ行の start 行目から nrows 行を読み込む (ヘッダーは読まず、列名は names を使う)。
+    索引を使って start 行目の直前の記録位置から読み始めるため、ファイルの先頭から読み直さない。
+    """
+    if start >= row_index.row_count or nrows <= 0:
+        return pd.DataFrame({name: pd.Series(dtype=str) for name in names})
+    block = start // row_index.step
+    skip = start - block * row_index.step
+    with open_input(file_path) as f:
+        f.seek(int(row_index.offsets[block]))
+        # skiprows は引用符内の改行 (CR LF) を行の区切りと数える場合があるため、読み込んでから切り出す
+        df = pd.read_csv(f, encoding=encoding, header=None, names=names, dtype=str, keep_default_na=False,
+                         nrows=skip + nrows)
+    df = df.iloc[skip:]
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
+
+def converted_output_path(input_path: str, output_dir: str = None) -> str:
+    """
+    入力ファイル名に _converted を付与した出力パスを返す。
+    圧縮・ZIP ファイルの場合は展開後の CSV として保存する (例: data.csv.gz -> data_converted.csv)
+    """
+    name, ext = os.path.splitext(_uncompressed_name(os.path.basename(input_path)))
+    directory = output_dir if output_dir is not None else os.path.dirname(input_path)
+    return os.path.join(directory, f"{name}{CONVERTED_SUFFIX}{ext}")
+
+
+def _uncompressed_name(file_name: str) -> str:
+    """圧縮の拡張子を除いたファイル名 (ZIP は .csv に置き換える)"""
+    compression = input_compression(file_name)
+    if compression is None:
+        return file_name
+    name = file_name[:-len(compression)]
+    return name + ".csv" if compression == ZIP_EXTENSION else name
+
+
+def expand_inputs(inputs: list) -> list:
+    """フォルダ指定を CSV ファイル (圧縮・ZIP を含む) に展開し、重複を除いた入力ファイルのリストを返す"""
+    file_paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            # 前回の変換結果 (*_converted.csv 等) は入力に含めない
+            file_paths.extend(
+                p for p in sorted(glob.glob(os.path.join(path, "*")))
+                if os.path.isfile(p) and is_csv_input(p)
+                and not os.path.splitext(_uncompressed_name(p))[0].endswith(CONVERTED_SUFFIX)
+            )
+        else:
+            file_paths.append(path)
+    # 順序を保って重複を除去
+    return list(dict.fromkeys(file_paths))
+
+
+def prepare_output_frame(df: pd.DataFrame, empty_col_mapping: dict) -> pd.DataFrame:
+    """空列プレースホルダーのヘッダーを空文字に置き換える"""
+    rename_dict = {ph: '' for ph in empty_col_mapping if ph in df.columns}
+    return df.rename(columns=rename_dict) if rename_dict else df
+
+
+def open_output_file(output_path: str):
+    """出力ファイルをバイナリモードで開く (拡張子が .gz / .bz2 / .xz の場合は圧縮して書き出す)"""
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension == ".gz":
+        return gzip.open(output_path, "wb", compresslevel=OUTPUT_GZIP_LEVEL)
+    if extension == ".bz2":
+        return bz2.open(output_path, "wb")
+    if extension == ".xz":
+        return lzma.open(output_path, "wb", preset=OUTPUT_XZ_PRESET)
+    return open(output_path, "wb")
+
+
+class QuotedCSVWriter:
+    """
+    すべてのフィールドをダブルクォートで囲んだCSVを、バイナリモードのファイルへ順次書き出す。
+    WRITE_BLOCK_ROWS 行ずつまとめて文字列化・エンコードするため、行数によらずメモリ使用量は一定の範囲に収まる。
+    出力内容は to_csv(index=False, quoting=csv.QUOTE_ALL) と同一 (改行コードは os.linesep、欠損値は空文字)。
+    engine に ENGINE_PYARROW を指定した場合、UTF-8 であれば PyArrow の CSV ライターで書き出す (出力内容は同一)。
+    """
+
+    def __init__(self, f, encoding: str, engine: str = ENGINE_C, lineterminator: str = os.linesep, bom: bool = True):
+        self.f = f
+        self.encoding = encoding
+        self.lineterminator = lineterminator
+        self._use_arrow = engine == ENGINE_PYARROW and pyarrow_available() and is_utf8(encoding)
+        # BOM 付き等の文字コードでも、ファイル先頭にのみ BOM を出力するよう1つのエンコーダーで書き出す
+        self._encoder = codecs.getincrementalencoder(encoding)()
+        if not bom:
+            self._encoder.encode("") # ファイルの途中を書き出す場合は BOM を出力しない
+        self._raw_utf8 = is_utf8(encoding)
+
+    def write_encoded(self, data: bytes):
+        """別に (bom=False の QuotedCSVWriter で) エンコードしたバイト列を続けて書き出す"""
+        self.f.write(self._encoder.encode("") + data) # ファイル先頭であれば BOM を付ける
+
+    def write(self, df: pd.DataFrame, header: bool = True):
+        if not len(df.columns):
+            # 項目のないデータは to_csv と同じ内容 (ヘッダー行は改行のみ) にする
+            self._write_text(self._to_csv(df, header))
+            return
+        if self._use_arrow and self._write_arrow(df, header):
+            return
+        if header:
+            self._write_text(self._quote_row([str(name) for name in df.columns]))
+        for start in range(0, len(df), WRITE_BLOCK_ROWS):
+            block = df.iloc[start:start + WRITE_BLOCK_ROWS]
+            data = _quoted_rows_arrow(block, self.lineterminator) if pa is not None else None
+            if data is not None and self._raw_utf8:
+                self.f.write(data)
+            elif data is not None:
+                self._write_text(data.decode("utf-8"))
+            else:
+                self._write_text(self._quoted_rows(block))
+
+    def _write_text(self, text: str):
+        if text:
+            self.f.write(self._encoder.encode(text))
+
+    def _quote_row(self, values: list) -> str:
+        return '"' + '","'.join(value.replace('"', '""') for value in values) + '"' + self.lineterminator
+
+    def _quoted_rows(self, block: pd.DataFrame) -> str:
+        """(PyArrow を使えない場合) 各列を文字列のリストにして行ごとに連結する"""
+        columns = []
+        for i in range(len(block.columns)):
+            values = block.iloc[:, i].tolist()
+            # 文字列・欠損値以外 (数値等) を含む場合は to_csv の書式に従う
+            if not all(isinstance(value, str) for value in values):
+                if not all(isinstance(value, str) or pd.isna(value) for value in values):
+                    return self._to_csv(block, header=False)
+                values = ["" if not isinstance(value, str) else value for value in values]
+            columns.append([value.replace('"', '""') for value in values])
+        separator = '","'
+        end = '"' + self.lineterminator
+        return "".join(['"' + separator.join(row) + end for row in zip(*columns)])
+
+    def _to_csv(self, df: pd.DataFrame, header: bool) -> str:
+        return df.to_csv(None, index=False, header=header, quoting=csv.QUOTE_ALL, lineterminator=self.lineterminator)
+
+    def _write_arrow(self, df: pd.DataFrame, header: bool) -> bool:
+        try:
+            options = pa_csv.WriteOptions(include_header=header, quoting_style="all_valid", eol=self.lineterminator)
+        except TypeError:
+            return False # 古い PyArrow (改行コードを指定できない) は既定の処理で書き出す
+        # 項目名の重複 (空列の "" 等) を許すため、列ごとの配列から Table を組み立てる
+        try:
+            arrays = [pa.array(df.iloc[:, i], type=pa.string(), from_pandas=True).fill_null("")
+                      for i in range(len(df.columns))]
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return False # 文字列・欠損値以外の値を含む場合は既定の処理で書き出す
+        table = pa.Table.from_arrays(arrays, names=[str(name) for name in df.columns])
+        pa_csv.write_csv(table, self.f, options)
+        return True
+
+
+def _quoted_rows_arrow(block: pd.DataFrame, lineterminator: str):
+    """
+    各列を PyArrow の文字列配列にして引用符の処理と連結を一括で行い、UTF-8 のバイト列を返す。
+    文字列・欠損値以外の値を含む列がある場合は None を返す。
+    """
+    string = pa.large_string()
+    try:
+        arrays = [pa_compute.replace_substring(
+                      pa.array(block.iloc[:, i], type=string, from_pandas=True).fill_null(""), '"', '""')
+                  for i in range(len(block.columns))]
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    joined = pa_compute.binary_join_element_wise(*arrays, pa.scalar('","', string))
+    lines = pa_compute.binary_join_element_wise(
+        pa.scalar('"', string), joined, pa.scalar('"' + lineterminator, string), pa.scalar("", string))
+    if isinstance(lines, pa.ChunkedArray):
+        lines = lines.combine_chunks()
+    # 連結した結果は1つの連続したバッファに格納されるため、範囲を切り出してそのまま書き出す
+    offsets = np.frombuffer(lines.buffers()[1], dtype=np.int64)
+    return memoryview(lines.buffers()[2])[offsets[lines.offset]:offsets[lines.offset + len(lines)]].tobytes()
+
+
+def write_csv(df: pd.DataFrame, output_path, encoding: str, header: bool = True, engine: str = ENGINE_C):
+    """
+    すべてのフィールドをダブルクォートで囲んでCSVを書き出す (QuotedCSVWriter を参照)。
+    output_path にはパス (拡張子が .gz / .bz2 / .xz の場合は圧縮) のほか、バイナリモードで開いたファイルも指定できる。
+    """
+    if isinstance(output_path, (str, os.PathLike)):
+        with open_output_file(output_path) as f:
+            QuotedCSVWriter(f, encoding, engine).write(df, header)
+    else:
+        QuotedCSVWriter(output_path, encoding, engine).write(df, header)
+
+
+def convert_file(input_path: str, output_path: str, profile: dict,
+                 encoding: str = "shift_jis", output_encoding: str = "shift_jis",
+                 chunksize: int = None, progress=None, cancel_event=None, engine: str = ENGINE_C,
+                 memory_map: bool = False, workers: int = None) -> dict:
+    """
+    1ファイルをプロファイル (または変換プラン) に従って変換し保存する (GUIの「変換して保存」と同じ動作)。
+    chunksize を指定した場合は chunksize 行ずつ読み込み・変換・追記する (ストリーミング保存)。
+    engine に ENGINE_PYARROW を指定した場合、一括処理では PyArrow で読み込み・書き出しを行い、
+    変換中も列を Arrow の文字列配列のまま扱う (使用できない場合は pandas 標準の処理に切り替える)。
+    memory_map を指定した場合はメモリマップしたファイルを PyArrow で直接解析して読み込む (分割読み込みでも有効。
+    PyArrow が未導入の場合・圧縮ファイル・Arrow で解釈できないファイルは pandas 標準の読み込みに切り替える)。
+    workers に2以上を指定した場合は、入力を行の区切りで約 PARALLEL_PARTITION_BYTES バイトずつに分割し、
+    最大 workers 個の別プロセスで並列に変換して元の順に書き出す (出力内容は同一。chunksize・engine・memory_map は使わない。
+    圧縮ファイル・1分割に収まるファイルは通常の処理になる)。
+    progress には progress(段階, 読み込み行数, 書き込み行数) の形で進捗が通知され、
+    cancel_event (threading.Event 等) がセットされると ConversionCancelled を送出する。
+    途中で失敗・中止した場合、書き出し途中のファイルは削除する。
+    処理結果の情報を辞書で返す。継続できない場合は ConversionError を送出する。
+    """
+    tracker = ProgressTracker(progress, cancel_event)
+    plan = profile if isinstance(profile, TransformPlan) else compile_profile(profile)
+    with _read_errors_as_conversion_error(input_path):
+        if workers is not None and workers > 1 and input_compression(input_path) is None:
+            partitions = partition_offsets(input_path, PARALLEL_PARTITION_BYTES)
+            if len(partitions) > 1:
+                result, _ = read_with_encodings(
+                    candidate_encodings(input_path, encoding),
+                    lambda candidate: _convert_parallel(input_path, output_path, plan, candidate, output_encoding,
+                                                        partitions, workers, tracker))
+                if result is not None:
+                    return result
+        if not chunksize:
+            return _convert_whole(input_path, output_path, plan, encoding, output_encoding, tracker, engine, memory_map)
+        encodings = candidate_encodings(input_path, encoding)
+        if memory_map and memory_map_available(input_path):
+            try:
+                result, _ = read_with_encodings(
+                    encodings, lambda candidate: _convert_chunked(input_path, output_path, plan, candidate,
+                                                                  output_encoding, chunksize, tracker, memory_map=True))
+                return result
+            except (pa.ArrowException, UnicodeDecodeError):
+                pass # 書き出し途中のファイルは削除済み。従来の読み込みで最初から処理し直す
+        # 途中で読み込めなくなった場合、書き出し途中のファイルは削除済み。代替の文字コードで最初から処理し直す
+        result, _ = read_with_encodings(
+            encodings,
+            lambda candidate: _convert_chunked(input_path, output_path, plan, candidate, output_encoding, chunksize, tracker))
+        return result
+
+
+@contextlib.contextmanager
+def _read_errors_as_conversion_error(input_path: str):
+    """入力ファイルの読み込みエラーを ConversionError に変換する"""
+    try:
+        yield
+    except UnicodeDecodeError:
+        raise ConversionError("UTF-8とShift-JISのどちらでもファイルを読み込めませんでした。")
+    except FileNotFoundError:
+        if os.path.exists(input_path):
+            raise # 出力先フォルダが存在しない場合など
+        raise ConversionError(f"ファイルが見つかりません: {input_path}")
+    except pd.errors.EmptyDataError:
+        raise ConversionError(f"ファイルが空か、CSVデータが含まれていません: {input_path}")
+    except pd.errors.ParserError as e:
+        raise ConversionError(f"CSVの形式が不正なため読み込めませんでした (項目数が揃わない行がある等): {e}")
+
+
+@contextlib.contextmanager
+def _open_output(output_path: str, encoding: str, engine: str = ENGINE_C):
+    """
+    出力ファイルを開き、書き出し用の QuotedCSVWriter を返す。
+    処理が途中で失敗・中止された場合は書き出し途中のファイルを削除する
+    """
+    f = open_output_file(output_path)
+    try:
+        with f:
+            yield QuotedCSVWriter(f, encoding, engine)
+    except BaseException:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+
+def _convert_whole(input_path: str, output_path: str, plan: "TransformPlan",
+                   encoding: str, output_encoding: str, tracker: ProgressTracker, engine: str = ENGINE_C,
+                   memory_map: bool = False) -> dict:
+    metrics = StageMetrics()
+    started = metrics.start()
+    # 出力に必要な項目のみ読み込む
+    df, used_encoding, used_engine = read_csv_with_fallback(input_path, encoding, tracker, plan.required_columns, engine,
+                                                            memory_map)
+    output_encoding = output_encoding_for(used_encoding, output_encoding)
+    metrics.add("読み込み", started, rows_out=len(df), columns_out=len(df.columns))
+
+    processor = CSVLayoutProcessor(plan, on_stage=tracker.update if tracker.active else None, metrics=metrics)
+    result_df = processor.process_dataframe(df)
+    del df
+
+    started = metrics.start()
+    if result_df.empty:
+        if not plan.reorder:
+            raise ConversionError("処理対象のデータがありません。ファイルを確認してください。")
+        # 並べ替え指定の結果が空の場合は空のファイルとして保存する
+        df_to_save = pd.DataFrame()
+    else:
+        df_to_save = prepare_output_frame(result_df, processor.empty_col_mapping)
+
+    output_header = not plan.remove_header
+    with _open_output(output_path, output_encoding, used_engine) as writer:
+        if not tracker.active or df_to_save.empty:
+            writer.write(df_to_save, header=output_header)
+        else:
+            # 書き込み行数の通知と中止の確認のため、一定行数ずつ書き出す
+            tracker.update("書き込み", rows_written=0)
+            for start in range(0, len(df_to_save), DEFAULT_CHUNKSIZE):
+                block = df_to_save.iloc[start:start + DEFAULT_CHUNKSIZE]
+                writer.write(block, header=output_header and start == 0)
+                tracker.update(rows_written=start + len(block))
+    metrics.add("書き込み", started, rows_in=len(result_df), rows_out=len(df_to_save),
+                columns_in=len(result_df.columns), columns_out=len(df_to_save.columns))
+
+    return {
+        "input_path": input_path,
+        "output_path": output_path,
+        "encoding": used_encoding,
+        "output_encoding": output_encoding,
+        "engine": used_engine,
+        "rows": len(result_df),
+        "warnings": processor.warnings,
+        "metrics": metrics.to_list(),
+    }
+
+
+def _convert_chunked(input_path: str, output_path: str, plan: "TransformPlan",
+                     encoding: str, output_encoding: str, chunksize: int, tracker: ProgressTracker,
+                     memory_map: bool = False) -> dict:
+    output_encoding = output_encoding_for(encoding, output_encoding)
+    metrics = StageMetrics()
+    processor = CSVLayoutProcessor(plan, on_stage=tracker.update if tracker.active else None, metrics=metrics)
+    output_header = not plan.remove_header
+    warnings = {} # チャンクごとに同じ警告が出るため順序を保って重複を除く
+    rows_read = 0
+    rows_written = 0
+
+    if memory_map:
+        chunk_source = read_csv_mapped_chunks(input_path, encoding, chunksize, plan.required_columns)
+    else:
+        chunk_source = read_csv_chunks(input_path, encoding, chunksize, plan.required_columns, tracker)
+    with chunk_source as reader, \
+            _open_output(output_path, output_encoding) as writer:
+        chunks = iter(reader)
+        while True:
+            started = metrics.start()
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            metrics.add("読み込み", started, rows_out=len(chunk), columns_out=len(chunk.columns))
+            rows_read += len(chunk)
+            tracker.update("読み込み", rows_read=rows_read)
+            result_df = processor.process_dataframe(chunk)
+            warnings.update(dict.fromkeys(processor.warnings))
+            if result_df.empty:
+                continue
+            # ヘッダーは最初に書き出すチャンクでのみ出力する
+            tracker.update("書き込み")
+            started = metrics.start()
+            output_df = prepare_output_frame(result_df, processor.empty_col_mapping)
+            writer.write(output_df, header=output_header and rows_written == 0)
+            metrics.add("書き込み", started, rows_in=len(result_df), rows_out=len(output_df),
+                        columns_in=len(result_df.columns), columns_out=len(output_df.columns))
+            rows_written += len(result_df)
+            tracker.update(rows_written=rows_written)
+
+        if rows_written == 0:
+            # 一括処理で結果が空だった場合と同じ扱いにする
+            if not plan.reorder:
+                raise ConversionError("処理対象のデータがありません。ファイルを確認してください。")
+            writer.write(pd.DataFrame(), header=output_header)
+
+    return {
+        "input_path": input_path,
+        "output_path": output_path,
+        "encoding": encoding,
+        "output_encoding": output_encoding,
+        "engine": ENGINE_C,
+        "rows": rows_written,
+        "warnings": list(warnings),
+        "metrics": metrics.to_list(),
+    }
+
+
+def partition_offsets(file_path: str, partition_bytes: int, block_size: int = INPUT_BUFFER_BYTES) -> list:
+    """
+    ファイルを約 partition_bytes バイトずつ、行の区切り (引用符で囲まれた値の中の改行を除く) で分割し、
+    各分割の (開始位置, 終了位置) のリストを返す。最初の分割はヘッダー行を含む。
+    build_row_index と同じく、引用符と改行は文字コードによらずバイト単位で判定する。
+    """
+    size = os.path.getsize(file_path)
+    starts = [0]
+    in_quotes = False
+    position = 0 # block の先頭の位置
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            # 次の分割の開始位置の目安を含むブロックのみ、その後の引用符の外の改行を探す
+            search = max(0, starts[-1] + partition_bytes - 1 - position)
+            counted = 0 # block[:counted] の引用符の数まで in_quotes に反映済み
+            while search < len(block):
+                newline = block.find(b"\n", search)
+                if newline < 0:
+                    break
+                in_quotes ^= block.count(b'"', counted, newline) % 2 == 1
+                counted = newline
+                search = newline + 1
+                if not in_quotes:
+                    if position + newline + 1 < size:
+                        starts.append(position + newline + 1)
+                    search = max(search, starts[-1] + partition_bytes - 1 - position)
+            in_quotes ^= block.count(b'"', counted) % 2 == 1
+            position += len(block)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _convert_parallel(input_path: str, output_path: str, plan: "TransformPlan", encoding: str, output_encoding: str,
+                      partitions: list, workers: int, tracker: ProgressTracker) -> dict:
+    first = _read_first_row(input_path, encoding)
+    if _has_row_labels(first):
+        return None # 分割ごとに読み込むと行ラベルにする列が変わるため、1プロセスで変換する
+    output_encoding = output_encoding_for(encoding, output_encoding)
+    header = list(first.columns)
+    usecols = None if plan.required_columns is None else _column_positions(header, plan.required_columns)
+    metrics = StageMetrics()
+    output_header = not plan.remove_header
+    warnings = {} # 分割ごとに同じ警告が出るため順序を保って重複を除く
+    rows_read = 0
+    rows_written = 0
+    workers = min(workers, len(partitions))
+
+    tracker.update("並列変換", rows_read=0, rows_written=0)
+    with _open_output(output_path, output_encoding) as writer, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                   mp_context=multiprocessing.get_context("spawn")) as executor:
+        try:
+            pending = []
+            next_partition = 0
+            while next_partition < len(partitions) or pending:
+                while next_partition < len(partitions) and len(pending) < workers * PARALLEL_PENDING_PER_WORKER:
+                    start, end = partitions[next_partition]
+                    pending.append(executor.submit(
+                        _convert_partition, input_path, encoding, output_encoding, plan,
+                        None if next_partition == 0 else header, usecols, len(header), start, end))
+                    next_partition += 1
+                # 先頭の分割から順に、変換が終わるのを待って書き出す
+                part = _wait_partition(pending.pop(0), tracker)
+                metrics.merge(part["metrics"])
+                warnings.update(dict.fromkeys(part["warnings"]))
+                rows_read += part["rows_read"]
+                tracker.update(rows_read=rows_read)
+                if not part["rows"]:
+                    continue
+                started = metrics.start()
+                # ヘッダーは最初に書き出す分割でのみ出力する
+                if output_header and rows_written == 0:
+                    writer.write_encoded(part["header"])
+                writer.write_encoded(part["data"])
+                metrics.add("書き込み", started)
+                rows_written += part["rows"]
+                tracker.update(rows_written=rows_written)
+        except BaseException:
+            # 未着手の分割は取り消し、処理中の分割の完了を待ってから書き出し途中のファイルを削除する
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
+        if rows_written == 0:
+            # 一括処理で結果が空だった場合と同じ扱いにする
+            if not plan.reorder:
+                raise ConversionError("処理対象のデータがありません。ファイルを確認してください。")
+            writer.write(pd.DataFrame(), header=output_header)
+
+    return {
+        "input_path": input_path,
+        "output_path": output_path,
+        "encoding": encoding,
+        "output_encoding": output_encoding,
+        "engine": ENGINE_C,
+        "rows": rows_written,
+        "warnings": list(warnings),
+        "metrics": metrics.to_list(),
+    }
+
+
+def _wait_partition(future, tracker: ProgressTracker) -> dict:
+    """分割の変換結果を待つ (待つ間も中止の指定を確認する)"""
+    while True:
+        try:
+            return future.result(timeout=0.1)
+        except concurrent.futures.TimeoutError:
+            tracker.update()
+
+
+def _convert_partition(input_path: str, encoding: str, output_encoding: str, plan: "TransformPlan", header,
+                       usecols, field_limit: int, start: int, end: int) -> dict:
+    """
+    (ワーカープロセスで実行) ファイルの start〜end バイト目の行を読み込んで変換し、
+    出力のヘッダー行とデータ行をそれぞれエンコードしたバイト列で返す。
+    header が None の場合は最初の分割 (先頭行がヘッダー行)。それ以外は header (ファイル全体の項目名) を使う。
+    field_limit はヘッダーの項目数 (これより項目数の多い行があれば pd.errors.ParserError を送出する)。
+    """
+    metrics = StageMetrics()
+    started = metrics.start()
+    with open(input_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # 項目数がヘッダーより多い行は、ファイル全体を読み込んだ場合と同じく解析エラーにする
+    # (usecols を指定した場合や各分割の先頭行は pandas が項目数を確認しない)
+    _check_partition_field_counts(data, encoding, field_limit)
+    # 2つ目以降の分割は、先頭行の項目数によって行ラベルを付けない
+    options = {} if header is None else {"header": None, "names": header, "index_col": False}
+    df = pd.read_csv(io.BytesIO(data), encoding=encoding, dtype=str, keep_default_na=False, usecols=usecols, **options)
+    del data
+    metrics.add("読み込み", started, rows_out=len(df), columns_out=len(df.columns))
+
+    # 各プロセスが CPU を使うため、プロセス内では列の処理をスレッドで並行して実行しない
+    processor = CSVLayoutProcessor(plan, metrics=metrics, threads=1)
+    result_df = processor.process_dataframe(df)
+    output = io.BytesIO()
+    header_size = 0
+    if not result_df.empty:
+        # 書き込みの計測は書き出した順に親プロセスで行う (ここではエンコードまで)
+        started = metrics.start()
+        output_df = prepare_output_frame(result_df, processor.empty_col_mapping)
+        writer = QuotedCSVWriter(output, output_encoding, bom=False)
+        writer.write(output_df.iloc[:0], header=True)
+        header_size = output.tell()
+        writer.write(output_df, header=False)
+        metrics.add("エンコード", started, rows_in=len(result_df), rows_out=len(output_df),
+                    columns_in=len(result_df.columns), columns_out=len(output_df.columns))
+    data = output.getbuffer()
+    return {
+        "header": bytes(data[:header_size]),
+        "data": bytes(data[header_size:]),
+        "rows": len(result_df),
+        "rows_read": len(df),
+        "warnings": processor.warnings,
+        "metrics": metrics.to_list(),
+    }
+
+
+def convert_files(input_paths: list, profile, encoding: str = "shift_jis", output_encoding: str = "shift_jis",
+                  output_dir: str = None, chunksize: int = None, engine: str = ENGINE_C, max_workers: int = None,
+                  on_start=None, on_file=None, cancel_event=None, memory_map: bool = False) -> list:
+    """
+    複数のファイルを同じプロファイル (または変換プラン) で変換し、*_converted.csv として保存する。
+    ファイルごとに別プロセスで並列に処理する (max_workers: 最大プロセス数, 既定は CPU 数)。
+    各ファイルの処理開始時に on_start(番号)、完了時に on_file(番号, 結果) が呼ばれる (番号は input_paths の位置)。
+    結果は convert_file の結果に "error" (失敗時のメッセージ, 成功時は None) を加えた辞書で、入力の順のリストで返す。
+    cancel_event がセットされると以降のファイルは処理せず、処理中のファイルの完了を待って ConversionCancelled を送出する。
+    """
+    plan = profile if isinstance(profile, TransformPlan) else compile_profile(profile)
+    jobs = [(input_path, converted_output_path(input_path, output_dir)) for input_path in input_paths]
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    results = [None] * len(jobs)
+
+    def started(index):
+        if on_start is not None:
+            on_start(index)
+
+    def finished(index, result):
+        results[index] = result
+        if on_file is not None:
+            on_file(index, result)
+
+    if workers <= 1:
+        # 1ファイルのみの場合などはプロセスを起動せずに処理する (この場合は処理中のファイルも中止できる)
+        for index, (input_path, output_path) in enumerate(jobs):
+            if cancel_event is not None and cancel_event.is_set():
+                raise ConversionCancelled()
+            started(index)
+            finished(index, _convert_file_job(input_path, output_path, plan, encoding, output_encoding,
+                                              chunksize, engine, cancel_event, memory_map))
+        return results
+
+    # Windows と同じ spawn 方式で起動する (GUI のスレッドを fork しない)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                mp_context=multiprocessing.get_context("spawn")) as executor:
+        # 同時に投入するのはプロセス数までとする (投入したファイルが処理中のファイルになる)
+        futures = {}
+        next_index = 0
+        while next_index < len(jobs) or futures:
+            while next_index < len(jobs) and len(futures) < workers:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                input_path, output_path = jobs[next_index]
+                futures[executor.submit(_convert_file_job, input_path, output_path, plan, encoding,
+                                        output_encoding, chunksize, engine, None, memory_map)] = next_index
+                started(next_index)
+                next_index += 1
+            if not futures:
+                break
+            done, _ = concurrent.futures.wait(futures, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in sorted(done, key=futures.get):
+                index = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # ワーカープロセスの異常終了など
+                    result = _failed_result(jobs[index][0], jobs[index][1], f"処理中に予期せぬエラーが発生しました: {e}")
+                finished(index, result)
+        if next_index < len(jobs):
+            # 処理中だったファイルの完了を待ってから中止する
+            raise ConversionCancelled()
+    return results
+
+
+def _convert_file_job(input_path: str, output_path: str, plan: "TransformPlan", encoding: str, output_encoding: str,
+                      chunksize: int, engine: str, cancel_event=None, memory_map: bool = False) -> dict:
+    """(ワーカープロセスで実行) 1ファイルを変換し、失敗した場合もエラーを結果として返す"""
+    try:
+        result = convert_file(input_path, output_path, plan, encoding, output_encoding,
+                              chunksize=chunksize, cancel_event=cancel_event, engine=engine, memory_map=memory_map)
+    except ConversionCancelled:
+        raise
+    except ConversionError as e:
+        return _failed_result(input_path, output_path, str(e))
+    except Exception as e:
+        return _failed_result(input_path, output_path, f"処理中に予期せぬエラーが発生しました: {e}")
+    result["error"] = None
+    return result
+
+
+def _failed_result(input_path: str, output_path: str, error: str) -> dict:
+    return {"input_path": input_path, "output_path": output_path, "rows": 0, "warnings": [], "metrics": [],
+            "error": error}
+
+
+def match_prefecture(series: pd.Series) -> pd.Series:
+    """
+    各値の先頭に一致する都道府県名を返す (一致しない値・文字列でない値は NaN)。
+    先頭3文字/4文字を切り出して集合と照合するため、行ごとに47件を順に比較する必要がない。
+    """
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        series = series.astype(object)
+    matched = None
+    for length, names in sorted(_PREFECTURES_BY_LENGTH.items()):
+        # 短い都道府県名で一致しなかった値のみを次の文字数で照合する
+        target = series if matched is None else series[matched.isna()]
+        if target.empty:
+            break
+        prefix = target.str.slice(0, length)
+        hit = prefix.where(prefix.isin(names))
+        matched = hit if matched is None else matched.fillna(hit)
+    return matched
+
+
+def remove_prefecture(series: pd.Series) -> pd.Series:
+    """都道府県名で始まる値のみ、その文字数分を先頭から取り除いた列を返す (それ以外の値はそのまま)"""
+    matched_lengths = match_prefecture(series).str.len()
+    result = series.copy()
+    for length in _PREFECTURES_BY_LENGTH:
+        mask = (matched_lengths == length).fillna(False)
+        if mask.any():
+            result[mask] = series[mask].str.slice(length)
+    return result
+
+
+def to_text(series: pd.Series) -> pd.Series:
+    """NaNを空文字に、数値等を文字列に変換した列を返す (文字列型の列は型を保つ)"""
+    if isinstance(series.dtype, pd.StringDtype):
+        return series.fillna('')
+    return series.fillna('').astype(str)
+
+
+def _is_arrow_text(series: pd.Series) -> bool:
+    """Arrow の文字列配列で保持された列か"""
+    return getattr(series.dtype, "storage", None) == "pyarrow"
+
+
+def join_columns(columns: list, separator: str) -> pd.Series:
+    """
+    複数の列を区切り文字で結合した列を返す (NaNは空文字として扱う)。
+    行ごとではなく列単位でまとめて連結する。
+    """
+    return _join_text([to_text(col) for col in columns], separator)
+
+
+def _join_text(texts: list, separator: str) -> pd.Series:
+    """文字列に変換済みの列を区切り文字で結合する"""
+    if len(texts) == 1:
+        return texts[0]
+    first = texts[0]
+    if all(_is_arrow_text(text) and text.dtype == first.dtype and text.index.equals(first.index) for text in texts):
+        # Arrow の文字列配列は Arrow の関数で連結する (str.cat と同じ結果。GIL を解放し、Python の文字列に戻さない)
+        arrays = [pa_compute.cast(pa.array(text.array), pa.large_string()) for text in texts]
+        joined = pa_compute.binary_join_element_wise(*arrays, pa.scalar(separator, pa.large_string()))
+        return pd.Series(joined, dtype=first.dtype, index=first.index, name=first.name)
+    return first.str.cat(texts[1:], sep=separator)
+
+
+def compose_replacements(rules) -> dict:
+    """
+    (置換前, 置換後) の規則を記述順に1つずつ適用した場合と同じ結果になる「元の値 -> 最終的な値」の対応表を返す。
+    連続した規則 (A→B, B→C) は A→C, B→C にまとめられる。
+    """
+    mapping = {} # 元の値 -> 現在の値 (含まれない値はそのまま)
+    sources = {} # 現在の値 -> その値になる元の値のリスト
+    for old, new in rules:
+        if old == new:
+            continue
+        moved = sources.pop(old, [])
+        if old not in mapping:
+            moved.append(old) # 元の値のままの old も置換対象
+        for source in moved:
+            mapping[source] = new
+        if moved:
+            sources.setdefault(new, []).extend(moved)
+    return mapping
+
+
+def transform_text(text: pd.Series, tokens=(), prefix: str = "", suffix: str = "", replacements: dict = None) -> pd.Series:
+    """
+    文字列に変換済みの列に、文字除去 → 文字追加 → 文字置換 をまとめて適用した列を返す。
+    tokens は記述順に除去し、前後に prefix / suffix を付けた後、値が replacements のキーと完全に一致すれば置換する。
+    列を1回だけ走査し、処理ごとに中間の列を作らない。
+    """
+    tokens = tuple(tokens)
+    replacements = replacements or {}
+
+    if _is_arrow_text(text):
+        # Arrow の文字列配列は Python の文字列に戻さず、列単位の演算 (Arrow の関数) で処理する
+        for token in tokens:
+            text = text.str.replace(token, '', regex=False)
+        if prefix or suffix:
+            text = prefix + text + suffix
+        if replacements:
+            replaced = text.map(replacements)
+            text = text.where(replaced.isna(), replaced)
+        return text
+
+    def convert(value):
+        for token in tokens:
+            value = value.replace(token, '')
+        value = prefix + value + suffix
+        return replacements.get(value, value)
+
+    return pd.Series([convert(value) for value in text.tolist()], index=text.index, name=text.name)
+
+
+def _setting_text(profile: dict, key: str) -> str:
+    value = profile.get(key, "")
+    return value if isinstance(value, str) else ""
+
+
+# --- 変換プラン ---
+# プロファイルの各設定 (自由記述のテキスト) を一度だけ解析・検証し、変更不可の操作リストにまとめる。
+# 各段階は設定の行の順に「操作」または「設定エラー」(ParseError) を保持する。
+# 項目の存在確認など、データに依存する検証は実行時に行う。
+
+@dataclass(frozen=True)
+class ParseError:
+    """設定の解析・検証エラー (該当行はスキップされる)"""
+    message: str
+
+
+@dataclass(frozen=True)
+class PrefCodeOp:
+    source_column: str
+    new_column: str
+
+
+@dataclass(frozen=True)
+class RemovePrefectureOp:
+    columns: tuple
+
+
+@dataclass(frozen=True)
+class ExtractOp:
+    line_num: int
+    line: str
+    new_column: str
+    source_column: str
+    start_index: int # 0始まり
+    end_index: int
+
+
+@dataclass(frozen=True)
+class RemoveOp:
+    line_num: int
+    line: str
+    column: str
+    tokens: tuple
+
+
+@dataclass(frozen=True)
+class AddOp:
+    line_num: int
+    line: str
+    column: str
+    position: str # "前" または "後"
+    text: str
+
+
+@dataclass(frozen=True)
+class ReplaceOp:
+    line_num: int
+    line: str
+    column: str
+    old: str
+    new: str
+
+
+@dataclass(frozen=True)
+class MergeOp:
+    line_num: int
+    line: str
+    new_column: str
+    source_columns: tuple
+    separator: str
+
+
+@dataclass(frozen=True)
+class ReorderOp:
+    columns: tuple # 空文字は空列の挿入位置
+
+
+@dataclass(frozen=True)
+class TransformPlan:
+    """プロファイルを解析・検証した変換プラン (段階ごとの操作のタプル)"""
+    get_pref_code: tuple = ()
+    remove_prefecture: tuple = ()
+    extract: tuple = ()
+    remove: tuple = ()
+    add: tuple = ()
+    replace: tuple = ()
+    merge: tuple = ()
+    reorder: tuple = ()
+    remove_header: bool = False
+
+    @property
+    def required_columns(self):
+        """
+        入力から読み込む必要のある項目名の集合 (None は全項目)。
+        並べ替えを指定した場合、並べ替え・各処理のいずれにも現れない項目は出力に影響しないため読み込まない。
+        """
+        if not self.reorder:
+            return None # 全項目を出力する
+        names = set()
+        for stage in PLAN_STAGES:
+            for item in getattr(self, stage):
+                for field in ("column", "source_column", "new_column"):
+                    names.add(getattr(item, field, ""))
+                for field in ("columns", "source_columns"):
+                    names.update(getattr(item, field, ()))
+        names.discard("") # 並べ替えの空列
+        return frozenset(names)
+
+    @property
+    def errors(self) -> list:
+        """設定エラーのメッセージ (処理の順)"""
+        return [item.message for stage in PLAN_STAGES for item in getattr(self, stage)
+                if isinstance(item, ParseError)]
+
+
+# 処理の順序 (TransformPlan のフィールド名)
+PLAN_STAGES = ("get_pref_code", "remove_prefecture", "extract", "remove", "add", "replace", "merge", "reorder")
+PLAN_CACHE_SIZE = 32
+
+_plan_cache = {}
+_plan_cache_lock = threading.Lock()
+
+
+def profile_key(profile: dict) -> str:
+    """プロファイルの内容から求めたハッシュ値 (変換プランのキャッシュキー)"""
+    content = json.dumps(profile, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def compile_profile(profile: dict) -> TransformPlan:
+    """
+    プロファイルを変換プランに変換する。
+    同じ内容のプロファイルは解析・検証を省略し、キャッシュ済みのプランを返す。
+    """
+    key = profile_key(profile)
+    with _plan_cache_lock:
+        plan = _plan_cache.get(key)
+    if plan is not None:
+        return plan
+
+    plan = TransformPlan(
+        get_pref_code=_compile_get_pref_code(profile),
+        remove_prefecture=_compile_remove_prefecture(profile),
+        extract=_compile_extract(profile),
+        remove=_compile_remove(profile),
+        add=_compile_add(profile),
+        replace=_compile_replace(profile),
+        merge=_compile_merge(profile),
+        reorder=_compile_reorder(profile),
+        remove_header=bool(profile.get("remove_header", False)),
+    )
+    with _plan_cache_lock:
+        if len(_plan_cache) >= PLAN_CACHE_SIZE:
+            _plan_cache.pop(next(iter(_plan_cache))) # 最も古いプランを破棄
+        _plan_cache[key] = plan
+    return plan
+
+
+def _compile_get_pref_code(profile: dict) -> tuple:
+    settings = profile.get("get_pref_code") or {}
+    if not settings.get("enabled", False):
+        return ()
+    source_col = (settings.get("source_column") or "").strip()
+    new_col = (settings.get("new_column") or "").strip() or DEFAULT_PREF_CODE_COLUMN
+    if not source_col:
+        return (ParseError("都道府県コード取得: 都道府県名を含む項目名が指定されていません。"),)
+    return (PrefCodeOp(source_col, new_col),)
+
+
+def _compile_remove_prefecture(profile: dict) -> tuple:
+    settings = profile.get("remove_prefecture") or {}
+    if not settings.get("enabled", False):
+        return ()
+    target_columns_str = (settings.get("column") or "").strip()
+    if not target_columns_str:
+        return (ParseError("都道府県名削除: 対象項目名が指定されていません。"),)
+    target_columns = tuple(col.strip() for col in target_columns_str.split(',') if col.strip())
+    return (RemovePrefectureOp(target_columns),)
+
+
+def _compile_merge(profile: dict) -> tuple:
+    items = []
+    # merge 設定を取得し、末尾の不要な空行を除去
+    merge_lines = _setting_text(profile, "merge").splitlines()
+    while merge_lines and not merge_lines[-1].strip():
+        merge_lines.pop()
+    merge_settings_content = "\n".join(merge_lines)
+    if not merge_settings_content:
+        return ()
+
+    # 各行を処理 (enumerate は 1 始まり)
+    for line_num, line in enumerate(merge_settings_content.split('\n'), 1):
+        # 先に strip せずに、まず空行かどうかだけチェック
+        if not line.strip(): continue # 実質的に空の行はスキップ
+
+        # コロンでの分割は元の line に対して行う
+        parts = line.split(':', 1)
+        if len(parts) != 2:
+            items.append(ParseError(f"結合設定(行 {line_num}): 形式が不正です (':')。スキップします: {line.strip()}"))
+            continue
+
+        # 新項目名部分のみ strip する
+        new_column = parts[0].strip()
+        # merge_info は strip せず、元の文字列（末尾スペースを含む可能性あり）を保持
+        merge_info = parts[1]
+
+        if not new_column:
+            items.append(ParseError(f"結合設定(行 {line_num}): 新項目名が空です。スキップします: {line.strip()}"))
+            continue
+
+        # --- 区切り文字抽出 ---
+        last_comma_index = merge_info.rfind(',')
+        if last_comma_index == -1:
+            # カンマがない場合: 結合元は1つ、区切り文字なしと解釈
+            source_columns_str = merge_info.strip()
+            separator = ''
+            source_columns = [source_columns_str] if source_columns_str else []
+        else:
+            # 最後のカンマより前が結合元項目リスト、後ろが区切り文字
+            source_columns_str = merge_info[:last_comma_index].strip()
+            separator = merge_info[last_comma_index + 1:] # 末尾のスペース等も区切り文字の一部として保持
+            source_columns = [col.strip() for col in source_columns_str.split(',') if col.strip()]
+        if not source_columns:
+            items.append(ParseError(f"結合設定(行 {line_num}): 結合元項目が指定されていません。スキップします: {line.strip()}"))
+            continue
+
+        items.append(MergeOp(line_num, line.strip(), new_column, tuple(source_columns), separator))
+    return tuple(items)
+
+
+def _compile_extract(profile: dict) -> tuple:
+    items = []
+    extract_settings = _setting_text(profile, "extract").strip()
+    if not extract_settings:
+        return ()
+    for line_num, line in enumerate(extract_settings.split('\n'), 1):
+        line = line.strip()
+        if not line: continue
+        parts = line.split(':', 3)
+        if len(parts) != 4:
+            items.append(ParseError(f"文字列抽出(行 {line_num}): 形式が不正 ('新:元:開始:文字数')。スキップします: {line}"))
+            continue
+
+        new_col, source_col, start_pos_str, num_chars_str = [p.strip() for p in parts]
+
+        if not new_col: items.append(ParseError(f"文字列抽出(行 {line_num}): 新項目名が空。スキップ: {line}")); continue
+        if not source_col: items.append(ParseError(f"文字列抽出(行 {line_num}): 抽出元項目が空。スキップ: {line}")); continue
+
+        try:
+            start_pos = int(start_pos_str)
+            num_chars = int(num_chars_str)
+        except ValueError: items.append(ParseError(f"文字列抽出(行 {line_num}): 開始位置/文字数が数値でない。スキップ: {line}")); continue
+        if start_pos < 1: items.append(ParseError(f"文字列抽出(行 {line_num}): 開始位置は1以上。スキップ: {line}")); continue
+        if num_chars < 0: items.append(ParseError(f"文字列抽出(行 {line_num}): 文字数は0以上。スキップ: {line}")); continue
+
+        start_index = start_pos - 1 # 0-based index
+        items.append(ExtractOp(line_num, line, new_col, source_col, start_index, start_index + num_chars))
+    return tuple(items)
+
+
+def _compile_remove(profile: dict) -> tuple:
+    items = []
+    remove_settings = _setting_text(profile, "remove").strip()
+    if not remove_settings:
+        return ()
+    for line_num, line in enumerate(remove_settings.split('\n'), 1):
+        line = line.strip()
+        if not line: continue
+        parts = line.split(':', 1)
+        if len(parts) != 2:
+            items.append(ParseError(f"文字除去(行 {line_num}): 形式が不正 (':')。スキップ: {line}")); continue
+
+        column = parts[0].strip()
+        chars_to_remove_str = parts[1].strip() # 除去する文字列表記 (カンマ区切り)
+
+        if not column: items.append(ParseError(f"文字除去(行 {line_num}): 項目名が空。スキップ: {line}")); continue
+        if not chars_to_remove_str: items.append(ParseError(f"文字除去(行 {line_num}): 除去文字が空。スキップ: {line}")); continue
+
+        # カンマ区切りで除去文字リストを作成
+        chars_to_remove_list = [c.strip() for c in chars_to_remove_str.split(',') if c.strip()]
+        if not chars_to_remove_list: items.append(ParseError(f"文字除去(行 {line_num}): 有効な除去文字がありません。スキップ: {line}")); continue
+
+        items.append(RemoveOp(line_num, line, column, tuple(chars_to_remove_list)))
+    return tuple(items)
+
+
+def _compile_add(profile: dict) -> tuple:
+    items = []
+    add_settings = _setting_text(profile, "add").strip()
+    if not add_settings:
+        return ()
+    for line_num, line in enumerate(add_settings.split('\n'), 1):
+        line = line.strip()
+        if not line: continue
+        parts = line.split(':', 2)
+        if len(parts) != 3:
+            items.append(ParseError(f"文字追加(行 {line_num}): 形式が不正 ('項目:位置:追加文字')。スキップ: {line}")); continue
+
+        column, position, chars_to_add = [p.strip() for p in parts]
+
+        if not column: items.append(ParseError(f"文字追加(行 {line_num}): 項目名が空。スキップ: {line}")); continue
+        if position not in ["前", "後"]: items.append(ParseError(f"文字追加(行 {line_num}): 位置は '前' または '後'。スキップ: {line}")); continue
+
+        items.append(AddOp(line_num, line, column, position, chars_to_add))
+    return tuple(items)
+
+
+def _compile_replace(profile: dict) -> tuple:
+    items = []
+    replace_settings = _setting_text(profile, "replace").strip()
+    if not replace_settings:
+        return ()
+    for line_num, line in enumerate(replace_settings.split('\n'), 1):
+        line = line.strip()
+        if not line: continue
+        parts = line.split(':', 2)
+        if len(parts) != 3:
+            items.append(ParseError(f"文字置換(行 {line_num}): 形式が不正 ('項目:置換前:置換後')。スキップ: {line}")); continue
+
+        column, old_str, new_str = [p.strip() for p in parts]
+
+        if not column: items.append(ParseError(f"文字置換(行 {line_num}): 項目名が空。スキップ: {line}")); continue
+        if not old_str: items.append(ParseError(f"文字置換(行 {line_num}): 置換前文字列が空。スキップ: {line}")); continue
+
+        items.append(ReplaceOp(line_num, line, column, old_str, new_str))
+    return tuple(items)
+
+
+def _compile_reorder(profile: dict) -> tuple:
+    reorder_settings = _setting_text(profile, "reorder").strip()
+    if not reorder_settings:
+        return ()
+    return (ReorderOp(tuple(col.strip() for col in reorder_settings.split(','))),)
+
+
+@dataclass(frozen=True)
+class _StageCheckpoint:
+    settings: tuple # この段階の設定 (TransformPlan のフィールドの値)
+    columns: dict # 段階の終了時の 項目名 -> 列
+    warnings: tuple
+    texts: dict # 文字列に変換した列のキャッシュ
+    output_columns: list
+    empty_col_mapping: dict
+
+
+@dataclass(frozen=True)
+class _ColumnTask:
+    """列の処理1件 (読み込む項目・書き込む項目と、列を計算して設定する処理)"""
+    reads: tuple
+    writes: tuple
+    run: object # run(columns): columns の writes の項目を設定する
+    error: object # error(例外): 失敗した場合の警告メッセージ
+
+
+class StageCheckpoints:
+    """
+    変換の各段階の出力を、その段階の設定とともに保持する (入力の DataFrame ごと)。
+    同じ入力を設定を変えて変換し直す場合は、設定が変わった最初の段階から処理を再開する。
+    列は段階間で共有し、書き換えずに置き換えるため、保持するのは差し替えられた列のみとなる。
+    """
+
+    def __init__(self):
+        self._source = None # 入力の DataFrame (同一のオブジェクトの場合のみ再利用する)
+        self._stages = [] # 段階の順の _StageCheckpoint
+        self._lock = threading.Lock()
+
+    def resume(self, df: pd.DataFrame, settings: list) -> tuple:
+        """
+        再開できる段階の番号と、その直前の段階の _StageCheckpoint (先頭から処理する場合は None) を返す。
+        settings は段階の順の設定のリスト。
+        """
+        with self._lock:
+            if self._source is not df:
+                return 0, None
+            start = 0
+            while start < len(self._stages) and self._stages[start].settings == settings[start]:
+                start += 1
+            return start, self._stages[start - 1] if start else None
+
+    def record(self, df: pd.DataFrame, stage_index: int, checkpoint: _StageCheckpoint):
+        """stage_index 番目の段階の出力を保持し、それ以降の段階の出力を破棄する"""
+        with self._lock:
+            if self._source is not df:
+                self._source = df
+                self._stages = []
+            if stage_index > len(self._stages):
+                return # 前の段階が破棄されている (別の変換と並行した場合など)
+            del self._stages[stage_index:]
+            self._stages.append(checkpoint)
+
+    def clear(self):
+        with self._lock:
+            self._source = None
+            self._stages = []
+
+
+class CSVLayoutProcessor:
+    """変換プラン (またはプロファイルの辞書) に従って DataFrame を変換する"""
+
+    # 処理の段階: (段階名, 処理メソッド名, 段階の設定 = TransformPlan のフィールド名)
+    STAGES = (
+        ("都道府県コード取得", "_process_get_pref_code", ("get_pref_code",)),
+        ("都道府県名削除", "_process_remove_prefecture", ("remove_prefecture",)),
+        ("文字列抽出", "_process_extract", ("extract",)),
+        ("文字除去・追加・置換", "_process_text", ("remove", "add", "replace")),
+        ("結合", "_process_merge", ("merge",)),
+        ("並べ替え", "_process_reorder", ("reorder",)),
+    )
+    # 列の処理に分けて実行できる段階 (処理メソッド名 -> 列の処理を設定の順に返すメソッド名)
+    COLUMN_TASKS = {
+        "_process_get_pref_code": "_get_pref_code_tasks",
+        "_process_remove_prefecture": "_remove_prefecture_tasks",
+        "_process_extract": "_extract_tasks",
+        "_process_text": "_text_tasks",
+        "_process_merge": "_merge_tasks",
+    }
+
+    def __init__(self, profile, on_stage=None, checkpoints: StageCheckpoints = None, metrics: StageMetrics = None,
+                 threads: int = None):
+        # プロファイルの辞書が渡された場合は変換プランに変換する (同じ内容ならキャッシュを使用)
+        self.plan = profile if isinstance(profile, TransformPlan) else compile_profile(profile or {})
+        # 各段階の開始時に on_stage(段階名) が呼ばれる (進捗通知・中止の確認用)
+        self.on_stage = on_stage
+        # 指定した場合は各段階の出力を保持し、設定を変更した段階以降のみやり直す
+        self.checkpoints = checkpoints
+        # 各段階の処理時間・行数・メモリ使用量の増減 (同じ計測先を渡すと読み込み・書き込みとまとめて記録できる)
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        # 互いに依存しない列の処理を並行して実行するスレッド数 (1 の場合は段階の順に1つずつ実行する)
+        self.threads = COLUMN_THREADS if threads is None else threads
+        self.warnings = []
+        # --- 空列マッピング (プレースホルダー名 -> 出力時のヘッダー) ---
+        self.empty_col_mapping = {}
+        # 項目名 -> (元の列, 文字列に変換した列)。同じ列の文字列変換を繰り返さないためのキャッシュ
+        self._texts = {}
+        self._index = None
+        self._output_columns = None # 並べ替え後の列名 (None は全列をそのまま出力)
+
+    def process_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        DataFrameに対して定義された処理を実行する (渡された DataFrame は変更しない)。
+        処理中は項目名 -> 列 の辞書で列を差し替えながら進め、最後に出力する列だけで DataFrame を組み立てる。
+        処理中の警告は self.warnings に、空列のマッピングは self.empty_col_mapping に格納される。
+        """
+        self._index = df.index
+        settings = [tuple(getattr(self.plan, field) for field in fields) for _, _, fields in self.STAGES]
+        start, checkpoint = (0, None) if self.checkpoints is None else self.checkpoints.resume(df, settings)
+        if checkpoint is None:
+            # 列は元の DataFrame と共有する (各段階は列を置き換えるだけで、元の列を書き換えない)
+            columns = {name: df[name] for name in df.columns}
+            self._texts = {}
+            self._output_columns = None
+            warnings = [] # 処理中の警告を収集するリスト
+            self.empty_col_mapping = {}
+        else:
+            # 設定が変わっていない段階までは保持した出力を使う
+            columns = dict(checkpoint.columns)
+            self._texts = dict(checkpoint.texts)
+            self._output_columns = checkpoint.output_columns
+            warnings = list(checkpoint.warnings)
+            self.empty_col_mapping = dict(checkpoint.empty_col_mapping)
+            for stage_name, _, _ in self.STAGES[:start]:
+                self.metrics.add_reused(stage_name)
+
+        if self.checkpoints is None and self._use_threads(df):
+            # 列の処理を依存関係に従ってスレッドで並行して実行する (失敗した処理があれば以下で段階の順にやり直す)
+            concurrent_result = self._process_columns_concurrently(columns, warnings)
+            if concurrent_result is not None:
+                columns, warnings, start = concurrent_result
+            else:
+                self._texts = {}
+
+        for stage_index in range(start, len(self.STAGES)):
+            stage_name, method_name, _ = self.STAGES[stage_index]
+            if self.on_stage is not None:
+                self.on_stage(stage_name)
+            started = self.metrics.start()
+            columns_in = len(columns)
+            columns, warnings = getattr(self, method_name)(columns, warnings)
+            self.metrics.add(stage_name, started, rows_in=len(self._index), rows_out=len(self._index),
+                             columns_in=columns_in,
+                             columns_out=len(columns if self._output_columns is None else self._output_columns))
+            if self.checkpoints is not None:
+                self.checkpoints.record(df, stage_index, _StageCheckpoint(
+                    settings=settings[stage_index], columns=dict(columns), warnings=tuple(warnings),
+                    texts=dict(self._texts), output_columns=self._output_columns,
+                    empty_col_mapping=dict(self.empty_col_mapping)))
+
+        self.warnings = warnings
+        self._texts = {}
+        return self._build_dataframe(columns)
+
+    def _use_threads(self, df: pd.DataFrame) -> bool:
+        """
+        列の処理をスレッドで並行して実行するか。
+        Arrow の文字列配列の処理 (Arrow の関数) は GIL を解放するため並行して進むが、
+        Python の文字列の列は GIL を保持したまま処理するため、並行して実行しても速くならない。
+        """
+        return (self.threads > 1 and len(df) >= COLUMN_THREADS_MIN_ROWS and len(df.columns) > 0
+                and all(_is_arrow_text(df.iloc[:, i]) for i in range(len(df.columns))))
+
+    def _process_columns_concurrently(self, columns: dict, warnings: list):
+        """
+        列の処理に分けて実行できる段階を、読み書きする項目が重なる処理どうしのみ設定の順に実行し、
+        それ以外はスレッドで並行して実行する (例: 結合元の項目を置換する処理の後に結合する)。
+        項目の有無の確認と警告は設定の順に行うため、結果と警告は段階の順に実行した場合と同じになる。
+        (columns, warnings, 次に実行する段階の番号) を返す。処理に失敗した場合は None を返す (段階の順にやり直す)。
+        """
+        columns = dict(columns)
+        warnings = list(warnings)
+        names = dict.fromkeys(columns) # 設定の順に処理した場合の、その時点の項目名 (追加された順)
+        tasks = [] # (段階の番号, _ColumnTask)
+        column_counts = [len(names)] # 各段階の開始時・終了時の項目数
+        stage_index = 0
+        while stage_index < len(self.STAGES) and self.STAGES[stage_index][1] in self.COLUMN_TASKS:
+            stage_name, method_name, _ = self.STAGES[stage_index]
+            if self.on_stage is not None:
+                self.on_stage(stage_name)
+            for task in getattr(self, self.COLUMN_TASKS[method_name])(names, warnings):
+                tasks.append((stage_index, task))
+                names.update(dict.fromkeys(task.writes))
+            column_counts.append(len(names))
+            stage_index += 1
+
+        # 各処理が待つ処理: 読み書きする項目を直前に書き込んだ処理と、書き込む項目をそれ以前に読み込んだ処理
+        last_writer = {} # 項目名 -> 処理の番号
+        readers = {} # 項目名 -> 直前の書き込み以降にその項目を読み込んだ処理の番号
+        dependents = [[] for _ in tasks]
+        waiting = []
+        for number, (_, task) in enumerate(tasks):
+            depends = {last_writer[name] for name in task.reads + task.writes if name in last_writer}
+            for name in task.writes:
+                depends.update(readers.get(name, ()))
+            for name in task.reads:
+                readers.setdefault(name, []).append(number)
+            for name in task.writes:
+                last_writer[name] = number
+                readers[name] = []
+            depends.discard(number)
+            for other in depends:
+                dependents[other].append(number)
+            waiting.append(len(depends))
+
+        seconds = [0.0] * len(tasks)
+        failed = []
+
+        def run(number):
+            started = time.perf_counter()
+            try:
+                tasks[number][1].run(columns)
+            except Exception:
+                failed.append(number)
+            seconds[number] = time.perf_counter() - started
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as executor:
+            running = {executor.submit(run, number): number for number, count in enumerate(waiting) if count == 0}
+            while running:
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    number = running.pop(future)
+                    if failed:
+                        continue # 実行中の処理の完了のみ待つ
+                    for dependent in dependents[number]:
+                        waiting[dependent] -= 1
+                        if waiting[dependent] == 0:
+                            running[executor.submit(run, dependent)] = dependent
+        if failed:
+            return None
+        # 追加された項目は完了した順に並ぶため、設定の順に処理した場合の順に並べ直す
+        columns = {name: columns[name] for name in names if name in columns}
+
+        # 各段階の処理時間は、その段階の列の処理の実行時間の合計とする
+        rows = len(self._index)
+        stage_seconds = [0.0] * stage_index
+        for number, (task_stage, _) in enumerate(tasks):
+            stage_seconds[task_stage] += seconds[number]
+        self.metrics.merge([{
+            "stage": self.STAGES[i][0], "seconds": stage_seconds[i], "rows_in": rows, "rows_out": rows,
+            "columns_in": column_counts[i], "columns_out": column_counts[i + 1], "memory_delta_bytes": None, "calls": 1,
+        } for i in range(stage_index)])
+        return columns, warnings, stage_index
+
+    def _build_dataframe(self, columns: dict) -> pd.DataFrame:
+        """出力する列のみを連結して DataFrame にする"""
+        names = list(columns) if self._output_columns is None else self._output_columns
+        if not names:
+            return pd.DataFrame()
+        return pd.concat([columns[name] for name in names], axis=1, keys=names)
+
+    def _text(self, columns: dict, name: str) -> pd.Series:
+        """列を文字列に変換して返す (変換済みの列はキャッシュを使う)"""
+        series = columns[name]
+        cached = self._texts.get(name)
+        if cached is not None and cached[0] is series:
+            return cached[1]
+        text = to_text(series)
+        self._texts[name] = (series, text)
+        return text
+
+    def _set_text(self, columns: dict, name: str, text: pd.Series):
+        """文字列のみからなる列を設定する (以降の文字列変換を省略できる)"""
+        columns[name] = text
+        self._texts[name] = (text, text)
+
+    def _process_get_pref_code(self, columns: dict, warnings: list) -> (dict, list):
+        return self._run_tasks(self._get_pref_code_tasks(columns, warnings), columns, warnings)
+
+    def _process_remove_prefecture(self, columns: dict, warnings: list) -> (dict, list):
+        return self._run_tasks(self._remove_prefecture_tasks(columns, warnings), columns, warnings)
+
+    def _process_extract(self, columns: dict, warnings: list) -> (dict, list):
+        return self._run_tasks(self._extract_tasks(columns, warnings), columns, warnings)
+
+    def _process_text(self, columns: dict, warnings: list) -> (dict, list):
+        return self._run_tasks(self._text_tasks(columns, warnings), columns, warnings)
+
+    def _process_merge(self, columns: dict, warnings: list) -> (dict, list):
+        return self._run_tasks(self._merge_tasks(columns, warnings), columns, warnings)
+
+    @staticmethod
+    def _run_tasks(tasks, columns: dict, warnings: list) -> (dict, list):
+        """列の処理を順に実行する (失敗した処理は警告を追加してスキップする)"""
+        for task in tasks:
+            try:
+                task.run(columns)
+            except Exception as e:
+                warnings.append(task.error(e))
+        return columns, warnings
+
+    # 以下の *_tasks は設定の順に項目の有無を確認して警告を追加し、実行する列の処理 (_ColumnTask) を順に返す。
+    # columns は項目の有無の確認のみに使う (段階の順に実行する場合は返した処理を実行してから次の設定へ進む)
+
+    def _get_pref_code_tasks(self, columns, warnings: list):
+        for op in self.plan.get_pref_code:
+            if isinstance(op, ParseError):
+                warnings.append(op.message)
+                continue
+
+            if op.source_column not in columns:
+                warnings.append(f"都道府県コード取得: 対象項目 '{op.source_column}' が見つかりません。")
+                continue
+            if op.new_column in columns:
+                warnings.append(f"都道府県コード取得: 新しい項目名 '{op.new_column}' は既に存在します。処理をスキップします。")
+                continue
+
+            def run(columns, op=op):
+                # 見つからない場合・文字列でない場合は空文字
+                self._set_text(columns, op.new_column,
+                               match_prefecture(columns[op.source_column]).map(PREFECTURE_CODES).fillna("").rename(op.new_column))
+
+            yield _ColumnTask(reads=(op.source_column,), writes=(op.new_column,), run=run,
+                              error=lambda e: f"都道府県コード取得処理中にエラー: {e}")
+
+    def _remove_prefecture_tasks(self, columns, warnings: list):
+        for op in self.plan.remove_prefecture:
+            if isinstance(op, ParseError):
+                warnings.append(op.message)
+                continue
+
+            valid_target_columns = []
+            for target_column in op.columns:
+                if target_column in columns:
+                    valid_target_columns.append(target_column)
+                else:
+                    warnings.append(f"都道府県名削除: 対象項目 '{target_column}' が見つかりません。")
+
+            if not valid_target_columns:
+                continue # 有効な対象列がない
+
+            def run(columns, targets=tuple(valid_target_columns)):
+                for target_column in targets:
+                    columns[target_column] = remove_prefecture(columns[target_column])
+
+            yield _ColumnTask(reads=tuple(valid_target_columns), writes=tuple(valid_target_columns), run=run,
+                              error=lambda e: f"都道府県名削除処理中にエラー: {e}")
+
+    def _extract_tasks(self, columns, warnings: list):
+        for op in self.plan.extract:
+            if isinstance(op, ParseError):
+                warnings.append(op.message)
+                continue
+
+            line_num = op.line_num
+            if op.source_column not in columns: warnings.append(f"文字列抽出(行 {line_num}): 抽出元項目 '{op.source_column}' が見つかりません。スキップ。"); continue
+            if op.new_column in columns: warnings.append(f"文字列抽出(行 {line_num}): 新項目名 '{op.new_column}' は既に存在。上書きします。")
+
+            def run(columns, op=op):
+                # 列単位でまとめて切り出す
+                # 開始位置が文字列長以上なら空文字、抽出範囲が文字列を超える場合は最後まで抽出
+                extracted = self._text(columns, op.source_column).str.slice(op.start_index, op.end_index)
+                self._set_text(columns, op.new_column, extracted.rename(op.new_column))
+
+            yield _ColumnTask(reads=(op.source_column,), writes=(op.new_column,), run=run,
+                              error=lambda e, op=op: f"文字列抽出(行 {op.line_num}): 処理中にエラー: {e}。スキップ: {op.line}")
+
+    def _text_tasks(self, columns, warnings: list):
+        """
+        文字除去・文字追加・文字置換をまとめて行う。
+        いずれも対象の項目だけを書き換えるため、項目ごとに3つの処理を続けて適用しても結果は変わらない。
+        警告は処理ごとに設定の行の順に出力する。
+        """
+        targets = {} # 項目名 -> {"tokens": 除去文字, "prefix": 前に追加, "suffix": 後に追加, "rules": 置換規則}
+
+        def target(column):
+            return targets.setdefault(column, {"tokens": [], "prefix": "", "suffix": "", "rules": []})
+
+        for op in self.plan.remove:
+            if isinstance(op, ParseError):
+                warnings.append(op.message)
+                continue
+            if op.column not in columns: warnings.append(f"文字除去(行 {op.line_num}): 項目 '{op.column}' が見つかりません。スキップ。"); continue
+            target(op.column)["tokens"].extend(op.tokens)
+
+        for op in self.plan.add:
+            if isinstance(op, ParseError):
+                warnings.append(op.message)
+                continue
+            if op.column not in columns: warnings.append(f"文字追加(行 {op.line_num}): 項目 '{op.column}' が見つかりません。スキップ。"); continue
+            settings = target(op.column)
+            if op.position == "前":
+                settings["prefix"] = op.text + settings["prefix"]
+            else:
+                settings["suffix"] = settings["suffix"] + op.text
+
+        for op in self.plan.replace:
+            if isinstance(op, ParseError):
+                warnings.append(op.message)
+                continue
+            if op.column not in columns: warnings.append(f"文字置換(行 {op.line_num}): 項目 '{op.column}' が見つかりません。スキップ。"); continue
+            target(op.column)["rules"].append((op.old, op.new))
+
+        for column, settings in targets.items():
+            def run(columns, column=column, settings=settings):
+                self._set_text(columns, column, transform_text(
+                    self._text(columns, column), settings["tokens"], settings["prefix"], settings["suffix"],
+                    compose_replacements(settings["rules"])))
+
+            yield _ColumnTask(reads=(column,), writes=(column,), run=run,
+                              error=lambda e, column=column: f"文字除去・追加・置換: 項目 '{column}' の処理中にエラー: {e}。スキップ。")
+
+    def _merge_tasks(self, columns, warnings: list):
+        for op in self.plan.merge:
+            if isinstance(op, ParseError):
+                warnings.append(op.message)
+                continue
+
+            # 結合元項目が存在するかチェック
+            missing_cols = [col for col in op.source_columns if col not in columns]
+            if missing_cols:
+                warnings.append(f"結合設定(行 {op.line_num}): 結合元項目が見つかりません: {', '.join(missing_cols)}。スキップします: {op.line}")
+                continue
+
+            # 新しい項目名が既に存在する場合の警告
+            if op.new_column in columns:
+                warnings.append(f"結合設定(行 {op.line_num}): 結合先の項目名 '{op.new_column}' は既に存在します。上書きします。")
+
+            def run(columns, op=op):
+                # 結合実行 (NaNを空文字に変換)
+                merged = _join_text([self._text(columns, col) for col in op.source_columns], op.separator)
+                self._set_text(columns, op.new_column, merged.rename(op.new_column))
+
+            yield _ColumnTask(reads=op.source_columns, writes=(op.new_column,), run=run,
+                              error=lambda e, op=op: f"結合設定(行 {op.line_num}): 結合処理中にエラー: {e}。スキップ: {op.line}")
+
+    def _process_reorder(self, columns: dict, warnings: list) -> (dict, list):
+        self.empty_col_mapping = {} # 並べ替え前にクリア
+
+        for op in self.plan.reorder:
+            specified_columns_with_blanks = op.columns
+            final_columns = []
+            new_empty_cols_mapping = {}
+            empty_col_counter = 1
+
+            for col_name in specified_columns_with_blanks:
+                if col_name: # 通常の列名
+                    if col_name in columns:
+                        final_columns.append(col_name)
+                    else:
+                        warnings.append(f"並べ替え: 指定された列 '{col_name}' はデータに存在しません。無視します。")
+                else: # 空列を追加 (,, の場合)
+                    # 一意なプレースホルダー名を生成
+                    placeholder_name = f"{EMPTY_COLUMN_PLACEHOLDER_PREFIX}{empty_col_counter}"
+                    while placeholder_name in columns:
+                        empty_col_counter += 1
+                        placeholder_name = f"{EMPTY_COLUMN_PLACEHOLDER_PREFIX}{empty_col_counter}"
+
+                    columns[placeholder_name] = pd.Series("", index=self._index, name=placeholder_name) # 空列
+                    final_columns.append(placeholder_name)
+                    new_empty_cols_mapping[placeholder_name] = '' # マッピングに追加
+                    empty_col_counter += 1
+
+            if not final_columns and specified_columns_with_blanks: # 何か指定はあったが無効だった
+                warnings.append("並べ替え: 指定された有効な列がありません。出力は空になります。")
+            # 出力する列のみで DataFrame を組み立てる (指定がない・有効な列がない場合は空)
+            self._output_columns = final_columns
+            self.empty_col_mapping = new_empty_cols_mapping
+
+        return columns, warnings
+
+
+class PagedResult:
+    """
+    変換結果の任意の範囲の行を、その範囲を含むページ (page_rows 行) のみ読み込み・変換して返す。
+    各段階の処理は行ごとに独立しているため、入力のある範囲の行を変換した結果は、変換結果の同じ範囲の行と一致する。
+    保持するのは行の位置の索引と直近の cache_pages ページのみで、メモリ使用量はファイルの行数によらずほぼ一定となる。
+    """
+
+    def __init__(self, file_path: str, encoding: str, profile, row_index: RowIndex = None,
+                 tracker: ProgressTracker = None, page_rows: int = PREVIEW_PAGE_ROWS,
+                 cache_pages: int = PREVIEW_PAGE_CACHE):
+        self.file_path = file_path
+        self.plan = profile if isinstance(profile, TransformPlan) else compile_profile(profile or {})
+        self.page_rows = page_rows
+        self.cache_pages = cache_pages
+        if row_index is None or not row_index.matches(file_path):
+            row_index = build_row_index(file_path, tracker=tracker)
+        self.row_index = row_index
+        # 判定済みの文字コードを先に試す (判定範囲より後ろに cp932 の拡張文字がある場合などは代替の文字コードで読む)
+        self._encodings = list(dict.fromkeys([encoding] + candidate_encodings(file_path, encoding)))
+        # ヘッダーの読み込みと同じ列名 (重複した項目名は pandas と同様に .1 などを付ける)
+        self._names = list(read_csv(file_path, encoding, nrows=0).columns)
+        self._pages = {} # ページ番号 -> 変換結果 (挿入順 = 使用順)
+        self._pages_lock = threading.Lock() # ワーカースレッドでの読み込みと画面での表示が同時に参照する
+        self.warnings = []
+        self.empty_col_mapping = {}
+
+    @property
+    def row_count(self) -> int:
+        return self.row_index.row_count
+
+    def rows(self, start: int, count: int) -> pd.DataFrame:
+        """
+        変換結果の start 行目から count 行を返す (インデックスは行番号)。
+        ページの読み込み・変換を行う (圧縮ファイルは記録位置まで展開し直す) ため、ワーカースレッドから呼び出す。
+        """
+        return self._rows(start, count, load=True)
+
+    def cached_rows(self, start: int, count: int):
+        """rows と同じ範囲を読み込み済みのページのみから返す (読み込んでいないページを含む場合は None)"""
+        return self._rows(start, count, load=False)
+
+    def _rows(self, start: int, count: int, load: bool):
+        start = max(0, start)
+        stop = min(self.row_count, start + count)
+        numbers = [0] if stop <= start else range(start // self.page_rows, (stop - 1) // self.page_rows + 1)
+        pages = [self._page(number, load) for number in numbers]
+        if any(page is None for page in pages):
+            return None
+        if stop <= start:
+            return pages[0].iloc[0:0]
+        result = pages[0] if len(pages) == 1 else pd.concat(pages)
+        return result.loc[start:stop - 1]
+
+    def _page(self, number: int, load: bool = True):
+        with self._pages_lock:
+            page = self._pages.pop(number, None)
+            if page is not None:
+                self._pages[number] = page # 最近使用したものとして末尾へ
+                return page
+        if not load:
+            return None
+        df, _ = read_with_encodings(self._encodings, lambda candidate: read_csv_rows(
+            self.file_path, candidate, self.row_index, number * self.page_rows, self.page_rows, self._names))
+        processor = CSVLayoutProcessor(self.plan)
+        page = processor.process_dataframe(df)
+        with self._pages_lock:
+            if not self._pages:
+                self.warnings = processor.warnings
+                self.empty_col_mapping = processor.empty_col_mapping
+            self._pages.pop(number, None)
+            if len(self._pages) >= self.cache_pages:
+                self._pages.pop(next(iter(self._pages))) # 最も長く使われていないページを破棄
+            self._pages[number] = page
+        return page
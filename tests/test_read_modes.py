@@ -0,0 +1,106 @@
+"""読み込み方法による変換結果の違いがないことの確認
+
+同じ入力・プロファイルを、一括・分割・PyArrow・メモリマップ・並列変換のそれぞれで convert_file に渡し、
+出力ファイルが一括読み込みの場合とバイト単位で一致することを確認する。
+項目数がヘッダーより多い行がある入力は、チャンクや分割の先頭に置いた場合も含めて、
+どの読み込み方法・プロファイルでも ConversionError になることを確認する。
+
+使用例:
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import csv_layout_core as core  # noqa: E402
+
+# チャンクの先頭行が入力の途中の行になるよう、小さいチャンクで読み込む
+CHUNKSIZE = 3
+
+READ_MODES = {
+    "whole": {},
+    "chunked": {"chunksize": CHUNKSIZE},
+    "pyarrow": {"engine": core.ENGINE_PYARROW},
+    "pyarrow_chunked": {"engine": core.ENGINE_PYARROW, "chunksize": CHUNKSIZE},
+    "mmap": {"memory_map": True},
+    "mmap_chunked": {"memory_map": True, "chunksize": CHUNKSIZE},
+    "tracked": {"progress": lambda stage, rows_read, rows_written: None},
+    "workers": {"workers": 2},
+}
+
+PROFILES = {
+    "none": {},
+    "reorder": {"reorder": "b,a"},
+    "reorder_one": {"reorder": "a"},
+    "merge": {"merge": "m:a,b,-", "reorder": "m,a"},
+    "replace": {"replace": "b:x:X", "add": "a:後:!"},
+}
+
+VALID_INPUTS = {
+    "plain": "a,b\n1,x\n2,y\n3,z\n4,x\n5,y\n6,z\n7,x\n",
+    "quoted": 'a,b\r\n"1,5","改行\r\nを含む"\r\n2,"引用符 "" を含む"\r\n"9,y",LOST\r\n,\r\n4,\r\n',
+    "japanese": "a,b,c\n東京,大阪,名古屋\n札幌,,福岡\n那覇,仙台,広島\n",
+    "short_rows": "a,b,c\n1,2\n3,4,5\n6\n7,8,9\n",
+    "row_labels": "a,b\n1,2,3\n4,5,6\n7,8,9\n",
+    "blank_lines": "a,b\n1,x\n\n2,y\n\n\n3,z\n",
+}
+
+# 項目数がヘッダーより多い行を含む入力 (LOST が切り捨てられずにエラーとなること)
+MALFORMED_INPUTS = {
+    # 2つ目のチャンク (CHUNKSIZE 行ごと) の先頭行
+    "chunk_boundary": "a,b\n1,x\n2,y\n3,z\n9,y,LOST\n4,x\n5,y\n",
+    "second_row": "a,b\n1,2\n3,4,5\n",
+    "last_row_without_newline": "a,b\n1,x\n2,y\n9,y,LOST",
+    "quoted_newline_before": 'a,b\n1,"x\ny"\n2,y\n9,y,LOST\n',
+    # 値の途中の引用符 (引用符の位置だけでは値の範囲を判定できない入力)
+    "quote_inside_value": 'a,b\n1,x"y\n2,y\n9,y,LOST\n',
+    # 先頭のデータ行が行ラベル付きの場合は、その項目数より多い行
+    "longer_than_row_labels": "a,b\n1,2,3\n4,5,6\n7,8,9,LOST\n",
+    "crlf": "a,b\r\n1,x\r\n2,y\r\n3,z\r\n9,y,LOST\r\n4,x\r\n",
+}
+
+
+@pytest.fixture(autouse=True)
+def small_partitions(monkeypatch):
+    """並列変換で入力が複数の分割に分かれるよう、分割の大きさを小さくする"""
+    monkeypatch.setattr(core, "PARALLEL_PARTITION_BYTES", 16)
+
+
+def write_input(tmp_path, text: str) -> str:
+    path = str(tmp_path / "input.csv")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    return path
+
+
+def convert(input_path: str, output_path: str, profile: dict, mode: str) -> bytes:
+    core.convert_file(input_path, output_path, profile, "utf-8", "utf-8", **READ_MODES[mode])
+    with open(output_path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+@pytest.mark.parametrize("name", VALID_INPUTS)
+def test_read_modes_write_the_same_output(tmp_path, name, profile):
+    input_path = write_input(tmp_path, VALID_INPUTS[name])
+    expected = convert(input_path, str(tmp_path / "whole.csv"), PROFILES[profile], "whole")
+    for mode in READ_MODES:
+        assert convert(input_path, str(tmp_path / f"{mode}.csv"), PROFILES[profile], mode) == expected, mode
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+@pytest.mark.parametrize("name", MALFORMED_INPUTS)
+def test_read_modes_reject_rows_with_too_many_fields(tmp_path, name, profile):
+    input_path = write_input(tmp_path, MALFORMED_INPUTS[name])
+    for mode in READ_MODES:
+        with pytest.raises(core.ConversionError, match="項目数"):
+            convert(input_path, str(tmp_path / f"{mode}.csv"), PROFILES[profile], mode)
+
+
+def test_field_count_check_reports_the_line(tmp_path):
+    input_path = write_input(tmp_path, MALFORMED_INPUTS["quoted_newline_before"])
+    # 引用符内の改行は行の区切りとして数えない
+    with pytest.raises(core.pd.errors.ParserError, match="4 行目"):
+        core.check_field_counts(input_path, "utf-8", block_size=5)